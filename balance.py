@@ -0,0 +1,106 @@
+# balance.py
+# Monte-Carlo balancing: plays many seeded headless rounds with a scripted catcher over a grid of
+# rule parameters, spread across a process pool, and streams one row per game to a CSV file.
+# Usage: python balance.py --item-speed 8 10.3 12 --winning-score 40 50 --games 200 --output balance.csv
+
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from simulation import ItemType, ITEM_WEIGHTS, POLICIES, Rules, WIN, LOSE, TIMEOUT, percentile, play_round
+
+COLUMNS = ['point', 'seed', 'item_speed', 'weights', 'spawn_threshold', 'speed_threshold',
+           'winning_score', 'winning_stars', 'outcome', 'score', 'stars', 'ticks']
+GAMES_PER_TASK = 25 # Rounds played per pool task, so pickling costs little next to the games
+
+def parse_weights(text):
+    '''"GOOD=4,BAD=4,BONUS=1,SLOWDOWN=1,SPEEDUP=1" -> {ItemType.GOOD: 4, ...}; missing types keep their default'''
+    weights = dict(ITEM_WEIGHTS)
+    for part in text.split(','):
+        name, weight = part.split('=')
+        weights[ItemType[name.strip().upper()]] = int(weight)
+    return weights
+
+def format_weights(weights):
+    return '/'.join(str(weights[item_type]) for item_type in ItemType)
+
+def grid(args):
+    '''Every combination of the parameter lists given on the command line'''
+    for values in itertools.product(args.item_speed, args.weights, args.spawn_threshold,
+                                    args.speed_threshold, args.winning_score, args.winning_stars):
+        yield dict(zip(['item_speed', 'weights', 'spawn_threshold', 'speed_threshold',
+                        'winning_score', 'winning_stars'], values))
+
+def play_games(point, params, seeds, policy_name):
+    '''Worker task: plays one round per seed at a grid point and returns a row for each'''
+    rules = Rules(item_speed=params['item_speed'], item_weights=params['weights'],
+                  spawn_threshold=params['spawn_threshold'], speed_threshold=params['speed_threshold'],
+                  winning_score=params['winning_score'], winning_stars=params['winning_stars'])
+    policy = POLICIES[policy_name]
+    rows = []
+    for seed in seeds:
+        round = play_round(rules, seed, policy)
+        rows.append([point, seed, params['item_speed'], format_weights(params['weights']),
+                     params['spawn_threshold'], params['speed_threshold'], params['winning_score'],
+                     params['winning_stars'], round.outcome, round.score, round.stars, round.ticks])
+    return rows
+
+def report(points, results, elapsed):
+    print(f"{'point':>5} {'speed':>6} {'weights':>11} {'spawn':>5} {'ramp':>4} {'win@':>4} {'stars':>5}"
+          f" {'games':>6} {'win%':>6} {'lose%':>6} {'time%':>6} {'mean':>6} {'p10':>4} {'p50':>4} {'p90':>4}")
+    total = 0
+    for point, params in enumerate(points):
+        rows = results[point]
+        if not rows:
+            continue
+        total += len(rows)
+        outcomes = [row[8] for row in rows]
+        scores = sorted(row[9] for row in rows)
+        rate = lambda outcome: 100 * outcomes.count(outcome) / len(rows)
+        print(f"{point:>5} {params['item_speed']:>6.2f} {format_weights(params['weights']):>11}"
+              f" {params['spawn_threshold']:>5} {params['speed_threshold']:>4} {params['winning_score']:>4}"
+              f" {params['winning_stars']:>5} {len(rows):>6} {rate(WIN):>6.1f} {rate(LOSE):>6.1f}"
+              f" {rate(TIMEOUT):>6.1f} {sum(scores) / len(scores):>6.1f} {percentile(scores, 0.1):>4}"
+              f" {percentile(scores, 0.5):>4} {percentile(scores, 0.9):>4}")
+    print(f'{total} games in {elapsed:.1f} s, {total / elapsed:,.0f} games/s')
+
+def main():
+    defaults = Rules()
+    parser = argparse.ArgumentParser(description='Play seeded headless rounds over a grid of rule parameters')
+    parser.add_argument('--item-speed', type=float, nargs='+', default=[defaults.item_speed])
+    parser.add_argument('--weights', type=parse_weights, nargs='+', default=[dict(ITEM_WEIGHTS)],
+                        help='spawn weights per grid point, e.g. GOOD=4,BAD=5')
+    parser.add_argument('--spawn-threshold', type=int, nargs='+', default=[defaults.spawn_threshold])
+    parser.add_argument('--speed-threshold', type=int, nargs='+', default=[defaults.speed_threshold])
+    parser.add_argument('--winning-score', type=int, nargs='+', default=[defaults.winning_score])
+    parser.add_argument('--winning-stars', type=float, nargs='+', default=[defaults.winning_stars])
+    parser.add_argument('--games', type=int, default=200, help='rounds per grid point')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first round at every grid point')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='catcher')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='balance.csv', help='CSV file, one row per game')
+    args = parser.parse_args()
+
+    points = list(grid(args))
+    results = {point: [] for point in range(len(points))}
+    start = time.perf_counter()
+    with open(args.output, 'w', newline='') as f, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        tasks = []
+        for point, params in enumerate(points):
+            for first in range(0, args.games, GAMES_PER_TASK):
+                seeds = range(args.seed + first, args.seed + min(first + GAMES_PER_TASK, args.games))
+                tasks.append(pool.submit(play_games, point, params, list(seeds), args.policy))
+        # Rows are written as tasks finish, so a long run can be inspected while it is going
+        for task in as_completed(tasks):
+            rows = task.result()
+            writer.writerows(rows)
+            results[rows[0][0]].extend(rows)
+    report(points, results, time.perf_counter() - start)
+    print(f'rows written to {args.output}')
+
+if __name__ == '__main__':
+    main()
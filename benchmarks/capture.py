@@ -0,0 +1,109 @@
+# benchmarks/capture.py
+# Cost of gameplay capture on the game thread. Renders gameplay frames paced to --fps, as Game.run
+# does, with capture off, to a PNG sequence and piped to an encoder, and reports per frame the work
+# of the game thread, the part of it spent in Capture.frame, and how many frames were written or
+# dropped. First checks that a captured PNG holds exactly the pixels that were on screen.
+# The encoder is ffmpeg when it is installed, otherwise a Python process that discards its input.
+# Usage: python benchmarks/capture.py [--frames 300] [--fps 60] [--items 4] [--buffers 8] [--block]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+os.chdir(ROOT)
+
+import pygame
+import main
+from simulation import Round, Rules, percentile
+
+SEED = 1234
+SINK = f'"{sys.executable}" -c "import sys; [None for _ in iter(lambda: sys.stdin.buffer.read(1 << 20), b\'\')]"'
+
+def gameplay(items_per_wave):
+    '''A Game showing a round that never ends, already full of items'''
+    game = main.Game()
+    game.screen = game.framebuffer()
+    state = main.GamePlayState(game)
+    rules = Rules(width=main.SIM_WIDTH, tick_rate=main.SIM_RATE, round_time=10**9, starting_stars=10**9,
+                  winning_score=10**9, items_per_wave=items_per_wave, max_items_per_wave=items_per_wave)
+    state.round = Round(rules, SEED)
+    game.state = state
+    for _ in range(90):
+        state.update([])
+    return game
+
+def check_png(game, directory):
+    '''A captured PNG decodes to exactly the frame on screen'''
+    game.state.render(game.screen)
+    main.Capture.start(game.screen, 60, directory)
+    main.Capture.frame(game.screen)
+    path = os.path.join(main.Capture.directory, 'frame-000000.png')
+    main.Capture.stop()
+    if pygame.image.tobytes(pygame.image.load(path), 'RGB') != pygame.image.tobytes(game.screen, 'RGB'):
+        raise SystemExit('captured PNG differs from the screen')
+    print('captured PNG matches the screen pixel for pixel')
+
+def run(game, frames, fps, mode, directory, command):
+    '''Per-frame game thread milliseconds, plus the capture stats (None when off) and how long the workers took to finish'''
+    if mode != 'off':
+        main.Capture.start(game.screen, fps, directory, command if mode == 'pipe' else None)
+    budget = 1 / fps
+    work = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        game.dirty_rects = None
+        game.step([], main.SIM_STEP)
+        game.state.render(game.screen)
+        if main.Capture.active:
+            main.Capture.frame(game.screen)
+        game.present()
+        elapsed = time.perf_counter() - start
+        work.append(elapsed * 1000)
+        if elapsed < budget:
+            time.sleep(budget - elapsed)
+    if mode == 'off':
+        return sorted(work), None, 0.0
+    start = time.perf_counter()
+    main.Capture.stop()
+    return sorted(work), main.Capture.stats(), time.perf_counter() - start
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Game-thread cost of capturing gameplay')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=int, default=main.FRAME_RATE)
+    parser.add_argument('--items', type=int, default=4, help='items per wave in the captured round')
+    parser.add_argument('--buffers', type=int, default=main.CAPTURE_BUFFERS)
+    parser.add_argument('--workers', type=int, default=main.CAPTURE_WORKERS)
+    parser.add_argument('--block', action='store_true', help='stall for a buffer instead of dropping frames')
+    parser.add_argument('--command', help='encoder command (default ffmpeg if installed, else a sink)')
+    args = parser.parse_args()
+    main.CAPTURE_BUFFERS, main.CAPTURE_WORKERS, main.CAPTURE_BLOCK = args.buffers, args.workers, args.block
+    command = args.command or (main.CAPTURE_COMMAND if shutil.which('ffmpeg') else SINK)
+
+    pygame.display.set_mode(main.WINDOW_SIZE)
+    main.AssetBundle.load_all()
+    game = gameplay(args.items)
+    with tempfile.TemporaryDirectory() as directory:
+        check_png(game, directory)
+        print(f"{'mode':<6} {'frame p50':>10} {'frame p95':>10} {'capture p50':>12} {'capture p95':>12}"
+              f" {'written':>8} {'dropped':>8} {'blocked ms':>11} {'peak queued':>12} {'drain s':>8}")
+        for mode in ('off', 'png', 'pipe'):
+            work, stats, drain = run(game, args.frames, args.fps, mode, directory, command)
+            if stats is None:
+                print(f"{mode:<6} {percentile(work, 0.5):>10.3f} {percentile(work, 0.95):>10.3f}")
+                continue
+            print(f"{mode:<6} {percentile(work, 0.5):>10.3f} {percentile(work, 0.95):>10.3f}"
+                  f" {stats['copy_p50_ms']:>12.3f} {stats['copy_p95_ms']:>12.3f} {stats['written']:>8}"
+                  f" {stats['dropped']:>8} {stats['blocked_ms']:>11.1f} {stats['peak_queued']:>12} {drain:>8.2f}")
+    print(f'pipe encoder: {command.split()[0]}')
+
+if __name__ == '__main__':
+    main_cli()
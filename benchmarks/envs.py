@@ -0,0 +1,111 @@
+# benchmarks/envs.py
+# Throughput of envs.VectorEnv against playing rounds one at a time. First replays the items every
+# session of a VectorEnv spawned into plain simulation.Round objects, with the same moves, and checks
+# after every tick that player, score, stars, item speed, falling items and the end of each round
+# agree, at the default rules and with big waves. Then steps batches of --envs sessions with a batched policy and reports session ticks per
+# second next to Round.tick driven by a per-session policy in a Python loop.
+# Usage: python benchmarks/envs.py [--envs 1 64 1024 8192] [--steps 2000] [--policy chase]
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from envs import OUTCOMES, POLICIES, TYPES, VectorEnv
+from simulation import ItemType, Round, Rules, SimItem, catcher_policy
+
+def replaying(rules, spawns):
+    '''A Round whose spawns are taken, in order, from the spawns list instead of its RNG'''
+    round = Round(rules, 0)
+    def spawn_item(x=None):
+        item_type, x = spawns.pop(0)
+        speed = round.item_speed - (rules.bad_item_slowdown if item_type == ItemType.BAD else 0)
+        return SimItem(item_type, 1, x, 0, rules.item_size, speed)
+    round.spawn_item = spawn_item
+    return round
+
+def check_equivalence(rules, capacity=16, sessions=16, steps=20000, seed=7):
+    env = VectorEnv(sessions, rules, seed, capacity)
+    spawns = [[] for _ in range(sessions)]
+    rounds = [replaying(rules, spawns[i]) for i in range(sessions)]
+    spawn_waves = env.spawn_waves
+    def recorded_spawn_waves():
+        first = env.spawned
+        spawn_waves()
+        new = env.active & (env.sequence >= first)
+        for slot, i in sorted(zip(*np.nonzero(new)), key=lambda entry: env.sequence[entry]):
+            spawns[i].append((TYPES[env.type[slot, i]], int(env.x[slot, i])))
+    env.spawn_waves = recorded_spawn_waves
+
+    rng = np.random.default_rng(seed)
+    finished = 0
+    for step in range(steps):
+        actions = rng.integers(-1, 2, size=sessions)
+        _, _, dones, info = env.step(actions)
+        for i, round in enumerate(rounds):
+            round.tick(int(actions[i]))
+        for done, i in enumerate(np.flatnonzero(dones)):
+            round = rounds[i]
+            got = (OUTCOMES[info['outcome'][done]], int(info['score'][done]), float(info['stars'][done]), int(info['ticks'][done]))
+            if got != (round.outcome, round.score, round.stars, round.ticks):
+                raise SystemExit(f'session {i} ended as {got}, Round as {(round.outcome, round.score, round.stars, round.ticks)}')
+            rounds[i] = replaying(rules, spawns[i])
+            finished += 1
+        for i, round in enumerate(rounds):
+            if dones[i]:
+                continue
+            got = (int(env.player_x[i]), int(env.player_speed[i]), int(env.score[i]), float(env.stars[i]),
+                   float(env.item_speed[i]), int(env.ticks[i]), int(np.count_nonzero(env.active[:, i])), round.outcome)
+            want = (round.player.x, round.player.speed, round.score, round.stars, round.item_speed, round.ticks,
+                    len(round.items), None)
+            if got != want:
+                raise SystemExit(f'session {i} diverged from Round at step {step}: {got} != {want}')
+    print(f'VectorEnv matches Round over {steps} steps of {sessions} sessions, {finished} rounds finished '
+          f'({rules.items_per_wave}-{rules.max_items_per_wave} items per wave, {len(env.active)} slots)')
+
+def time_vector(envs, steps, policy):
+    env = VectorEnv(envs, seed=envs)
+    observations = env.reset()
+    for _ in range(steps):
+        observations, _, _, _ = env.step(policy(observations))
+    return env.stats()
+
+def time_rounds(seconds=2.0):
+    '''Round.tick with the scripted catcher, one session at a time, as play_round runs them'''
+    ticks = 0
+    start = time.perf_counter()
+    seed = 0
+    while time.perf_counter() - start < seconds:
+        round = Round(Rules(), seed)
+        while round.outcome is None:
+            round.tick(catcher_policy(round))
+        ticks += round.ticks
+        seed += 1
+    return ticks / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched VectorEnv steps vs one Round at a time')
+    parser.add_argument('--envs', type=int, nargs='+', default=[1, 64, 1024, 8192])
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='chase')
+    args = parser.parse_args()
+
+    check_equivalence(Rules())
+    # Big waves from two slots: the slots grow, and sessions catch several effects in one tick
+    check_equivalence(Rules(items_per_wave=12, max_items_per_wave=20, spawn_interval=10), capacity=2, steps=5000)
+    baseline = time_rounds()
+    print(f'Round one at a time (catcher): {baseline:,.0f} ticks/s')
+    print(f"{'envs':>6} {'steps/s':>10} {'env steps/s':>13} {'vs Round':>9} {'rounds':>7} {'win':>6} {'lose':>6} {'timeout':>8}")
+    for envs in args.envs:
+        stats = time_vector(envs, args.steps, POLICIES[args.policy])
+        outcomes = stats['outcomes']
+        print(f"{envs:>6} {stats['steps'] / stats['step_seconds']:>10,.0f} {stats['env_steps_per_s']:>13,.0f}"
+              f" {stats['env_steps_per_s'] / baseline:>8.1f}x {stats['rounds']:>7} {outcomes['win']:>6}"
+              f" {outcomes['lose']:>6} {outcomes['timeout']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/idle.py
+# CPU used by the real Game.run loop while nothing on screen changes: the menu and instruction
+# screens, the end screen and a paused round. Each scenario runs for --seconds of wall time with low
+# power off (every frame redrawn and flipped, as before) and on (drawn once, then asleep in
+# pygame.event.wait until input), and reports CPU time as a percentage of one core.
+# The paused round starts with the fade-out already finished; until then the pause screen animates.
+# Every measurement is its own process, since Game.run shuts pygame down when it returns.
+# Usage: python benchmarks/idle.py [--seconds 5] [--fps 60] [--only main_menu paused]
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+os.chdir(ROOT)
+
+import pygame
+import main
+
+def static_state(state_class):
+    return lambda game: state_class(game)
+
+def game_over(game):
+    main.SCORE, main.STAR = main.WINNING_SCORE, 5
+    return main.GameOverState(game)
+
+def paused(game):
+    state = main.GamePlayState(game)
+    state.pause_frames = main.PAUSE_FADE_FRAMES
+    main.paused = True
+    return state
+
+SCENARIOS = {
+    'main_menu': static_state(main.MainMenuState),
+    'instruction3': static_state(main.Instruction3),
+    'game_over': game_over,
+    'paused': paused,
+}
+
+def child(name, seconds, fps, low_power):
+    '''Prints CPU percent, frames presented and idle wakeups from the first frame until the window is closed'''
+    pygame.display.set_mode(main.WINDOW_SIZE)
+    main.AssetBundle.load_all()
+    # Finish the background loading run() starts, so only the loop itself is measured
+    keys = main.GamePlayState.prefetch_assets() + main.GameOverState.prefetch_assets()
+    while main.AssetLoader.progress(keys) < 1:
+        time.sleep(0.01)
+    game = main.Game()
+    game.low_power = low_power
+    game.state = SCENARIOS[name](game)
+    start = {}
+    present = game.present
+    def timed_present():
+        present()
+        if not start:
+            start['wall'], start['cpu'] = time.perf_counter(), time.process_time()
+            pygame.time.set_timer(pygame.QUIT, int(seconds * 1000), 1)
+    game.present = timed_present
+    game.run(frame_rate=fps)
+    wall = time.perf_counter() - start['wall']
+    cpu = time.process_time() - start['cpu']
+    print(100 * cpu / wall, game.frames, game.idle_wakeups)
+
+def measure(name, seconds, fps, low_power):
+    args = [sys.executable, os.path.abspath(__file__), '--child', name,
+            '--seconds', str(seconds), '--fps', str(fps)] + ([] if low_power else ['--no-low-power'])
+    out = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    cpu, frames, wakeups = out.split()[-3:]
+    return float(cpu), int(frames), int(wakeups)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Idle CPU of static screens with and without low power')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=int, default=main.FRAME_RATE)
+    parser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS))
+    parser.add_argument('--child', choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument('--no-low-power', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.seconds, args.fps, not args.no_low_power)
+        return
+
+    print(f"{'scenario':<14} {'cpu before':>11} {'frames':>7} {'cpu after':>10} {'frames':>7} {'wakeups':>8}")
+    for name in args.only or SCENARIOS:
+        before, frames_before, _ = measure(name, args.seconds, args.fps, False)
+        after, frames_after, wakeups = measure(name, args.seconds, args.fps, True)
+        print(f'{name:<14} {before:>10.1f}% {frames_before:>7} {after:>9.1f}% {frames_after:>7} {wakeups:>8}')
+
+if __name__ == '__main__':
+    main_cli()
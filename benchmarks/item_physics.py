@@ -0,0 +1,91 @@
+# benchmarks/item_physics.py
+# Per-tick cost of moving, culling and catching N falling items with
+#   sprite:  pygame sprites and CollisionManager.check_collision, one item at a time
+#   round:   simulation.Round, plain Python objects
+#   vector:  stress.VectorRound, NumPy arrays
+# Also checks that VectorRound plays the same rounds as Round before timing anything.
+# Usage: python benchmarks/item_physics.py [--counts 100 1000 10000] [--ticks 50]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+from simulation import Round, Rules, SimItem, idle_policy, play_round
+from stress import VectorRound
+
+def check_equivalence(seeds=5):
+    rules = Rules(items_per_wave=300, max_items_per_wave=300)
+    for seed in range(seeds):
+        expected = play_round(rules, seed, idle_policy)
+        actual = VectorRound(rules, seed)
+        while actual.outcome is None:
+            actual.tick(idle_policy(actual))
+        got = (actual.outcome, actual.score, actual.stars, actual.ticks, actual.item_count())
+        want = (expected.outcome, expected.score, expected.stars, expected.ticks, len(expected.items))
+        if got != want:
+            raise SystemExit(f'VectorRound diverged from Round at seed {seed}: {got} != {want}')
+    print(f'VectorRound matches Round on {seeds} seeds with 300 items per wave')
+
+def population(rules, count, seed):
+    '''count items spread over the field, falling slowly so most stay alive while timed'''
+    rng = random.Random(seed)
+    return [SimItem(rng.choice(rules.spawn_table()), 1, rng.randint(0, rules.width - rules.item_size),
+                    rng.randint(0, int(rules.ground_y)), rules.item_size, 1) for _ in range(count)]
+
+def time_round(round_class, rules, items, ticks):
+    round = round_class(rules)
+    for item in items:
+        round.add_item(item, [])
+    start = time.perf_counter()
+    for _ in range(ticks):
+        round.update_items([])
+    return (time.perf_counter() - start) / ticks
+
+def time_sprites(rules, items, ticks):
+    import pygame
+    import main
+    pygame.display.set_mode((main.WIDTH, main.HEIGHT))
+    player = main.Player((rules.player_x, rules.player_y), main.GamePlayState.PLAYER_SIZE, rules.player_speed)
+    sprites = []
+    for item in items:
+        sprite = main.Item(item.type, main.Item.image_path(item.type, 1), (item.x, item.y), main.Item.SIZE, item.speed)
+        sprites.append(sprite)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        remaining = []
+        for sprite in sprites:
+            sprite.rect.y += int(sprite.speed)
+            if sprite.rect.y >= main.GROUND_Y:
+                continue
+            if main.CollisionManager.check_collision(player, sprite):
+                continue
+            remaining.append(sprite)
+        sprites = remaining
+    return (time.perf_counter() - start) / ticks
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-sprite vs vectorized item physics')
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--ticks', type=int, default=50)
+    args = parser.parse_args()
+    os.chdir(ROOT)
+
+    check_equivalence()
+    rules = Rules()
+    print(f"{'items':>7} {'sprite ms':>10} {'round ms':>10} {'vector ms':>10} {'vs sprite':>10}")
+    for count in args.counts:
+        sprite = time_sprites(rules, population(rules, count, count), args.ticks)
+        plain = time_round(Round, rules, population(rules, count, count), args.ticks)
+        vector = time_round(VectorRound, rules, population(rules, count, count), args.ticks)
+        print(f'{count:>7} {sprite * 1000:>10.3f} {plain * 1000:>10.3f} {vector * 1000:>10.3f} {sprite / vector:>9.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/render.py
+# Frames per second and per-frame latency of every game state, rendered headlessly
+# (SDL_VIDEODRIVER=dummy, SDL_AUDIODRIVER=dummy) so runs on the same machine are comparable.
+# Each frame is what Game.run does for that state: simulation ticks, render and the display push.
+#
+# Usage:
+#   python benchmarks/render.py --save benchmarks/baseline.json
+#   python benchmarks/render.py --compare benchmarks/baseline.json --threshold 0.10
+#   python benchmarks/render.py --resolution 600x450 [--smooth]   # internal framebuffer scaled to the window
+# A scenario regresses when both its mean and median frame times are more than threshold slower than the baseline.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+os.chdir(ROOT)
+
+import pygame
+import main
+from simulation import Round, Rules, percentile
+
+SEED = 1234
+WARMUP_TICKS = 90 # Ticks run before timing gameplay, so the screen is already full of items
+
+def static_state(state_class):
+    def setup(game, screen):
+        game.state = state_class(game)
+        def frame():
+            game.state.render(screen)
+            game.present()
+        return frame
+    return setup
+
+def gameplay(items_per_wave, spawn_interval=30, dirty=False, paused=False):
+    '''A round that never ends, with items_per_wave items every spawn_interval ticks'''
+    def setup(game, screen):
+        game.dirty_rects_enabled = dirty
+        state = main.GamePlayState(game)
+        rules = Rules(width=main.SIM_WIDTH, tick_rate=main.SIM_RATE, round_time=10**9, starting_stars=10**9,
+                      winning_score=10**9, spawn_interval=spawn_interval,
+                      items_per_wave=items_per_wave, max_items_per_wave=items_per_wave)
+        state.round = Round(rules, SEED)
+        game.state = state
+        for _ in range(WARMUP_TICKS):
+            state.update([])
+        def frame():
+            game.dirty_rects = None
+            if paused:
+                state.render_paused(screen)
+            else:
+                game.step([], main.SIM_STEP)
+                state.render(screen)
+            game.present()
+        return frame
+    return setup
+
+def game_over(win):
+    def setup(game, screen):
+        main.SCORE, main.STAR = (main.WINNING_SCORE, 5) if win else (10, 0)
+        return static_state(main.GameOverState)(game, screen)
+    return setup
+
+SCENARIOS = {
+    'main_menu': static_state(main.MainMenuState),
+    'instruction1': static_state(main.Instruction1),
+    'instruction2': static_state(main.Instruction2),
+    'instruction3': static_state(main.Instruction3),
+    'instruction4': static_state(main.Instruction4),
+    'instruction5': static_state(main.Instruction5),
+    'gameplay_1': gameplay(1),
+    'gameplay_2': gameplay(2),
+    'gameplay_3': gameplay(3),
+    'gameplay_4': gameplay(4),
+    'gameplay_4_dirty': gameplay(4, dirty=True),
+    'gameplay_stress_100': gameplay(100, spawn_interval=10),
+    'gameplay_stress_500': gameplay(500, spawn_interval=10),
+    'paused': gameplay(4, paused=True),
+    'game_over_win': game_over(True),
+    'game_over_lose': game_over(False),
+}
+
+def measure(name, frames, smooth=False):
+    game = main.Game()
+    game.smooth_scaling = smooth
+    screen = game.screen = game.framebuffer()
+    frame = SCENARIOS[name](game, screen)
+    for _ in range(5):
+        frame()
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        frame()
+        times.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(times)
+    mean = sum(times) / len(times)
+    return {'frames': frames, 'fps': 1000 / mean, 'mean_ms': mean,
+            'p50_ms': percentile(ordered, 0.5), 'p95_ms': percentile(ordered, 0.95),
+            'p99_ms': percentile(ordered, 0.99)}
+
+def compare(results, baseline, threshold):
+    '''Prints the change per scenario; returns the names that regressed'''
+    regressions = []
+    print(f"{'scenario':<22} {'base ms':>9} {'now ms':>9} {'change':>8}")
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<22} {"":>9} {result["mean_ms"]:>9.3f}      new')
+            continue
+        change = result['mean_ms'] / base['mean_ms'] - 1
+        regressed = change > threshold and result['p50_ms'] / base['p50_ms'] - 1 > threshold
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<22} {base["mean_ms"]:>9.3f} {result["mean_ms"]:>9.3f} {change:>+7.1%}{flag}')
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Headless rendering benchmark for every game state')
+    parser.add_argument('--frames', type=int, default=200, help='timed frames per scenario')
+    parser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS), help='run just these scenarios')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown, 0.10 = 10%%')
+    parser.add_argument('--resolution', type=main.parse_resolution, metavar='WIDTH[xHEIGHT]',
+                        help='render into a framebuffer of this size, scaled to the window')
+    parser.add_argument('--smooth', action='store_true', help='smooth instead of nearest-neighbour scaling')
+    args = parser.parse_args()
+
+    if args.resolution is not None:
+        main.set_resolution(args.resolution)
+    pygame.display.set_mode(main.WINDOW_SIZE)
+    main.AssetBundle.load_all()
+    results = {}
+    print(f"{'scenario':<22} {'fps':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in args.only or SCENARIOS:
+        result = measure(name, args.frames, args.smooth)
+        results[name] = result
+        print(f"{name:<22} {result['fps']:>9.1f} {result['mean_ms']:>9.3f} {result['p50_ms']:>9.3f}"
+              f" {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+
+    report = {
+        'meta': {'python': platform.python_version(), 'pygame': pygame.version.ver,
+                 'platform': platform.platform(), 'width': main.WIDTH, 'window': list(main.WINDOW_SIZE),
+                 'smooth': args.smooth, 'frames': args.frames},
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline written to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} scenario(s) regressed by more than {args.threshold:.0%}: {", ".join(regressions)}')
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main_cli()
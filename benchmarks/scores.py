@@ -0,0 +1,96 @@
+# benchmarks/scores.py
+# Score store at scale: queues --rows rounds spread over --days days through ScoreStore.add_many and
+# times how fast the writer thread commits them, then times the end-screen queries against the full
+# table: all-time and daily top-K, the rank of a score and the seven-day summary. Also times add() as
+# the game calls it, and the leaderboard while a second batch of rows is being written (WAL lets the
+# reads go on during the commits).
+# Usage: python benchmarks/scores.py [--rows 1000000] [--days 365] [--batch-size 500] [--path scores.db]
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scores import ScoreStore, day_of
+from simulation import percentile
+
+QUERY_RUNS = 200
+
+def rounds(count, days, seed):
+    '''count result rows in COLUMNS order, played over the last days days'''
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(count):
+        played_at = now - rng.random() * days * 86400
+        outcome = rng.choice(('win', 'lose', 'timeout'))
+        yield (played_at, day_of(played_at), rng.randint(0, 300), rng.choice((0, 0.5, 1, 2, 3, 4, 5)),
+               outcome, rng.randint(300, 3600), i)
+
+def timings(run, repeat=QUERY_RUNS):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return percentile(times, 0.5), percentile(times, 0.95), times[-1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Insert throughput and query latency of the score store')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--path', help='database file (default: a temporary one)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.path or os.path.join(directory, 'scores.db')
+        store = ScoreStore(path, batch_size=args.batch_size)
+        rows = list(rounds(args.rows, args.days, 1))
+        start = time.perf_counter()
+        store.add_many(rows)
+        queued = time.perf_counter() - start
+        store.flush()
+        elapsed = time.perf_counter() - start
+        print(f'insert: {args.rows:,} rows in {elapsed:.2f} s, {args.rows / elapsed:,.0f} rows/s '
+              f'({store.batches:,} batches of up to {args.batch_size}; queueing took {queued:.2f} s)')
+        size = sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+        print(f'database: {size / 2**20:.1f} MB')
+
+        today = datetime.date.today().isoformat()
+        middle = (datetime.date.today() - datetime.timedelta(days=args.days // 2)).isoformat()
+        queries = {
+            'top 10 all-time': lambda: store.top(10),
+            'top 10 today': lambda: store.top(10, today),
+            'top 10 of one day': lambda: store.top(10, middle),
+            'leaderboard (5+5)': lambda: store.leaderboard(5),
+            'rank of 150 today': lambda: store.rank(150, today),
+            'rank of 150 all-time': lambda: store.rank(150),
+            'last 7 days summary': lambda: store.daily(7),
+        }
+        print(f"{'query':<22} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for name, run in queries.items():
+            repeat = 10 if name == 'rank of 150 all-time' else QUERY_RUNS
+            p50, p95, worst = timings(run, repeat)
+            print(f'{name:<22} {p50:>9.3f} {p95:>9.3f} {worst:>9.3f}')
+
+        p50, p95, worst = timings(lambda: store.add(120, 3, 'win', 2000), 1000)
+        print(f'add() on the game thread: p50 {p50 * 1000:.1f} us, p95 {p95 * 1000:.1f} us, max {worst * 1000:.1f} us')
+        store.flush()
+
+        # Reads while the writer commits another 100k rows
+        more = list(rounds(100_000, args.days, 2))
+        store.add_many(more)
+        p50, p95, worst = timings(lambda: store.leaderboard(5))
+        store.flush()
+        print(f'leaderboard while writing: p50 {p50:.3f} ms, p95 {p95:.3f} ms, max {worst:.3f} ms')
+        store.close()
+
+if __name__ == '__main__':
+    main()
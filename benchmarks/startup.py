@@ -0,0 +1,69 @@
+# benchmarks/startup.py
+# Compares a cold launch (no prescaled bundle on disk) with warm launches that read the bundle.
+# Reports time-to-first-frame of Game.run and the time until every full-screen image is converted.
+# Usage: python benchmarks/startup.py [--runs N]
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child(mode):
+    '''One launch, measured from interpreter start of the game module'''
+    sys.path.insert(0, ROOT)
+    import pygame
+    import main
+    if mode == 'first-frame':
+        game = main.Game()
+        game.run(max_frames=1)
+        print(game.time_to_first_frame, main.AssetBundle.bundle_hits, main.AssetBundle.bundle_misses)
+    else:
+        pygame.display.set_mode((main.WIDTH, main.HEIGHT))
+        main.AssetBundle.load_all()
+        print(time.perf_counter() - main.LAUNCH_TIME, main.AssetBundle.bundle_hits, main.AssetBundle.bundle_misses)
+
+def launch(mode):
+    env = dict(os.environ)
+    env['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    elapsed, hits, misses = out.split()[-3:]
+    return float(elapsed), int(hits), int(misses)
+
+def compare(mode, bundle_dir, runs):
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    cold, _, cold_misses = launch(mode)
+    if mode == 'first-frame':
+        launch('all-screens') # A cold first frame only writes the welcome screen; fill the bundle
+    warm = [launch(mode) for _ in range(runs)]
+    warm_avg = sum(elapsed for elapsed, _, _ in warm) / len(warm)
+    print(f'{mode}:')
+    print(f'  cold launch: {cold * 1000:8.1f} ms ({cold_misses} screens decoded and scaled)')
+    print(f'  warm launch: {warm_avg * 1000:8.1f} ms (mean of {len(warm)}, {warm[-1][1]} screens read from bundle)')
+    print(f'  speedup:     {cold / warm_avg:8.2f}x')
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold vs warm startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='warm launches to average')
+    parser.add_argument('--child', choices=['first-frame', 'all-screens'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    if args.child:
+        child(args.child)
+        return
+
+    sys.path.insert(0, ROOT)
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    os.chdir(ROOT)
+    import main as game
+    bundle_dir = os.path.join(ROOT, game.AssetBundle.bundle_dir(game.AssetBundle.size()))
+    compare('first-frame', bundle_dir, args.runs)
+    compare('all-screens', bundle_dir, args.runs)
+
+if __name__ == '__main__':
+    main()
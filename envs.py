@@ -0,0 +1,300 @@
+# envs.py
+# Batched environments for training and evaluating bots: VectorEnv holds N independent rounds in NumPy
+# arrays, one row per session, and step(actions) advances all of them by one tick with a fixed number
+# of array operations, whatever N is. The rules are those of simulation.Round (burst spawns, the
+# ItemType weights, catching, effects and their expiry, difficulty and the end of a round), applied in
+# the same order within a tick. Sessions draw from one NumPy generator, so they do not reproduce the
+# rounds of Round for a given seed, and finished sessions start a new round by themselves.
+# Requires numpy.
+
+import time
+import numpy as np
+from simulation import ItemType, Rules
+
+TYPES = list(ItemType) # Type code stored in VectorEnv.type -> ItemType
+GOOD, BAD, BONUS, SLOWDOWN, SPEEDUP = (TYPES.index(item_type) for item_type in
+                                       (ItemType.GOOD, ItemType.BAD, ItemType.BONUS, ItemType.SLOWDOWN, ItemType.SPEEDUP))
+
+# Outcome codes in VectorEnv.outcome and the info of step()
+PLAYING, WIN, LOSE, TIMEOUT = 0, 1, 2, 3
+OUTCOMES = ('playing', 'win', 'lose', 'timeout')
+
+OBSERVED_ITEMS = 4 # Falling items in an observation, lowest first
+# Columns of an observation. Positions are fractions of the field width and of the fall to the ground;
+# items are (x, y, type code, present), zeros when fewer are falling.
+OBSERVATION = ('player_x', 'player_speed', 'score', 'stars', 'remaining', 'item_speed') + \
+              tuple(f'item{i}_{column}' for i in range(OBSERVED_ITEMS) for column in ('x', 'y', 'type', 'present'))
+
+class VectorEnv:
+    '''num_envs rounds played in lockstep. step(actions) takes -1, 0 or 1 per session and returns
+       (observations, rewards, dones, info); a session that finishes starts over in the same call,
+       and info holds the score, stars, ticks and outcome it finished with.
+       The reward of a tick is the score gained plus the stars lost (negative).'''
+    def __init__(self, num_envs, rules=None, seed=None, capacity=16):
+        self.rules = rules or Rules()
+        if self.rules.precise_collision:
+            raise ValueError('VectorEnv catches on rect overlap only; precise_collision needs Round')
+        if self.rules.pattern() != Rules(spawn_pattern='burst').pattern():
+            raise ValueError('VectorEnv plays the burst spawn pattern only')
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        weights = np.array([self.rules.item_weights.get(item_type, 0) for item_type in TYPES], np.float64)
+        self.type_odds = weights / weights.sum()
+        self.item_speed_penalty = np.array([self.rules.bad_item_slowdown if code == BAD else 0.0
+                                            for code in range(len(TYPES))])
+
+        # Sessions
+        self.player_x = np.zeros(num_envs, np.int64)
+        self.player_speed = np.zeros(num_envs, np.int64)
+        self.score = np.zeros(num_envs, np.int64)
+        self.stars = np.zeros(num_envs, np.float64)
+        self.item_speed = np.zeros(num_envs, np.float64)
+        self.ticks = np.zeros(num_envs, np.int64)
+        self.wave_size = np.zeros(num_envs, np.int64)
+        self.spawn_threshold = np.zeros(num_envs, np.int64)
+        self.speed_threshold = np.zeros(num_envs, np.int64)
+        # Effects: tick the slowdown or boost started and the tick its end is due, -1 when not active
+        self.slowdown_start = np.zeros(num_envs, np.int64)
+        self.slowdown_due = np.zeros(num_envs, np.int64)
+        self.boost_start = np.zeros(num_envs, np.int64)
+        self.boost_due = np.zeros(num_envs, np.int64)
+        self.outcome = np.zeros(num_envs, np.int8)
+
+        # Falling items: capacity slots by session, so what is done for each session's items (counting,
+        # picking the lowest) is one element-wise pass over every session per slot. Spawn order is the
+        # sequence number, not the slot.
+        self.active = np.zeros((capacity, num_envs), bool)
+        self.x = np.zeros((capacity, num_envs), np.int32)
+        self.y = np.zeros((capacity, num_envs), np.int32)
+        self.fall = np.zeros((capacity, num_envs), np.int32) # Pixels per tick: int() of the speed, as Round moves items
+        self.type = np.zeros((capacity, num_envs), np.int8)
+        self.sequence = np.zeros((capacity, num_envs), np.int64)
+        self.spawned = 0
+
+        self.steps = 0
+        self.step_time = 0.0
+        self.rounds = 0
+        self.outcomes = np.zeros(len(OUTCOMES), np.int64)
+        self.reset_envs(np.ones(num_envs, bool))
+
+    def columns(self):
+        return ('active', 'x', 'y', 'fall', 'type', 'sequence')
+
+    def grow(self):
+        for name in self.columns():
+            column = getattr(self, name)
+            grown = np.zeros((len(column) * 2, self.num_envs), column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def reset(self):
+        '''Starts every session over; returns the observations'''
+        self.reset_envs(np.ones(self.num_envs, bool))
+        return self.observe()
+
+    def reset_envs(self, mask):
+        '''Starts a new round in every session whose mask entry is True'''
+        rules = self.rules
+        self.player_x[mask] = int(rules.player_x)
+        self.player_speed[mask] = rules.player_speed
+        self.score[mask] = 0
+        self.stars[mask] = rules.starting_stars
+        self.item_speed[mask] = rules.item_speed
+        self.ticks[mask] = 0
+        self.wave_size[mask] = rules.items_per_wave
+        self.spawn_threshold[mask] = rules.spawn_threshold
+        self.speed_threshold[mask] = rules.speed_threshold
+        self.slowdown_due[mask] = -1
+        self.boost_due[mask] = -1
+        self.outcome[mask] = PLAYING
+        self.active[:, mask] = False
+
+    def step(self, actions):
+        '''One tick of every session. actions: -1, 0 or 1 per session.'''
+        start = time.perf_counter()
+        actions = np.asarray(actions)
+        score, stars = self.score.copy(), self.stars.copy()
+        self.move_players(actions)
+        self.spawn_waves()
+        self.update_items()
+        self.update_timers()
+
+        rewards = (self.score - score) + (self.stars - stars)
+        dones = self.outcome != PLAYING
+        info = {'score': self.score[dones], 'stars': self.stars[dones], 'ticks': self.ticks[dones],
+                'outcome': self.outcome[dones]}
+        if dones.any():
+            self.rounds += int(np.count_nonzero(dones))
+            self.outcomes += np.bincount(self.outcome[dones], minlength=len(OUTCOMES))
+            self.reset_envs(dones)
+        observations = self.observe()
+        self.steps += 1
+        self.step_time += time.perf_counter() - start
+        return observations, rewards.astype(np.float32), dones, info
+
+    def move_players(self, actions):
+        '''Round.move_player for every session'''
+        rules = self.rules
+        x, speed, size = self.player_x, self.player_speed, rules.player_size
+        x -= np.where((actions < 0) & (x > 0), speed, 0)
+        x += np.where((actions > 0) & (x + size < rules.width), speed, 0)
+        np.clip(x, 0, rules.width - size, out=x)
+
+    def spawn_waves(self):
+        '''Round.spawn_wave: score-driven wave growth, then a wave every spawn_interval ticks'''
+        rules = self.rules
+        grow = (self.score >= self.spawn_threshold) & (self.wave_size < rules.max_items_per_wave)
+        self.wave_size += grow
+        self.spawn_threshold += np.where(grow, rules.spawn_threshold_step, 0)
+
+        counts = np.where((self.ticks + 1) % rules.spawn_interval == 0, self.wave_size, 0)
+        if not counts.any():
+            return
+        while (np.count_nonzero(~self.active, axis=0) < counts).any():
+            self.grow()
+        # The first counts[i] free slots of session i
+        free = ~self.active
+        slots = free & (np.cumsum(free, axis=0) <= counts)
+        envs = np.nonzero(slots)[1]
+        spawned = len(envs)
+        codes = self.rng.choice(len(TYPES), size=spawned, p=self.type_odds)
+        self.active[slots] = True
+        self.type[slots] = codes
+        self.x[slots] = self.rng.integers(0, rules.width - rules.item_size, size=spawned, endpoint=True)
+        self.y[slots] = 0
+        self.fall[slots] = (self.item_speed[envs] - self.item_speed_penalty[codes]).astype(np.int32)
+        self.sequence[slots] = np.arange(self.spawned, self.spawned + spawned)
+        self.spawned += spawned
+
+    def update_items(self):
+        '''Round.update_items: move, land on the ground or get caught, for every item of every session'''
+        rules = self.rules
+        active, x, y = self.active, self.x, self.y
+        np.add(y, self.fall, out=y, where=active)
+        size = rules.item_size
+        px = self.player_x
+        py, player_size = int(rules.player_y), rules.player_size
+        landed = active & (y >= rules.ground_y)
+        caught = active & ~landed & (x < px + player_size) & (px < x + size) & (y < py + player_size) & (py < y + size)
+        active &= ~(landed | caught)
+        if not caught.any():
+            return
+
+        slots, envs = np.nonzero(caught)
+        types = self.type[slots, envs]
+        counts = np.bincount(envs * len(TYPES) + types, minlength=self.num_envs * len(TYPES)).reshape(self.num_envs, -1)
+        self.score += counts[:, GOOD] + 3 * counts[:, BONUS]
+        self.stars -= 0.5 * counts[:, BAD] + counts[:, SLOWDOWN]
+
+        # Slowdowns and boosts depend on the current speed, so apply them in spawn order: every
+        # session's first such catch together, then every second one, and so on
+        effect = (types == SLOWDOWN) | (types == SPEEDUP)
+        if not effect.any():
+            return
+        slots, envs = slots[effect], envs[effect]
+        order = np.lexsort((self.sequence[slots, envs], envs))
+        slots, envs = slots[order], envs[order]
+        firsts = np.flatnonzero(np.r_[True, envs[1:] != envs[:-1]])
+        rank = np.arange(len(envs)) - np.repeat(firsts, np.diff(np.r_[firsts, len(envs)]))
+        for r in range(int(rank.max()) + 1):
+            caught_by = envs[rank == r]
+            codes = self.type[slots[rank == r], caught_by]
+            self.catch_effects(caught_by[codes == SLOWDOWN], caught_by[codes == SPEEDUP])
+
+    def catch_effects(self, slowed, boosted):
+        '''Round.catch for the speed effects, at most one catch per session'''
+        rules = self.rules
+        slowed = slowed[self.player_speed[slowed] > rules.slowdown_penalty]
+        self.player_speed[slowed] -= rules.slowdown_penalty
+        self.slowdown_start[slowed] = self.ticks[slowed]
+        self.slowdown_due[slowed] = self.ticks[slowed] + int(rules.slowdown_duration * rules.tick_rate + 0.5)
+        self.player_speed[boosted] += rules.boost_bonus
+        self.boost_start[boosted] = self.ticks[boosted]
+        self.boost_due[boosted] = self.ticks[boosted] + int(rules.boost_duration * rules.tick_rate + 0.5)
+
+    def update_timers(self):
+        '''Round.update_timers: clock, effect expiry, item speed-up and the end of the round'''
+        rules = self.rules
+        self.ticks += 1
+        elapsed = self.ticks / rules.tick_rate
+        remaining = rules.round_time - elapsed
+        for start, due, duration in ((self.slowdown_start, self.slowdown_due, rules.slowdown_duration),
+                                     (self.boost_start, self.boost_due, rules.boost_duration)):
+            ending = due == self.ticks
+            if ending.any():
+                # As Round.expire: durations that are not a whole number of ticks end on the first tick past them
+                early = ending & (elapsed - start / rules.tick_rate < duration)
+                due[early] += 1
+                ending &= ~early
+                due[ending] = -1
+                self.player_speed[ending] = rules.player_speed
+
+        faster = self.score >= self.speed_threshold
+        self.item_speed += np.where(faster, rules.speed_step, 0.0)
+        self.speed_threshold += np.where(faster, rules.speed_threshold_step, 0)
+
+        win = (self.score >= rules.winning_score) & (self.stars > rules.winning_stars)
+        lose = ~win & (self.stars <= 0)
+        timeout = ~win & ~lose & (remaining <= 0)
+        self.outcome[win] = WIN
+        self.outcome[lose] = LOSE
+        self.outcome[timeout] = TIMEOUT
+
+    def observe(self):
+        '''float32 array of shape (num_envs, len(OBSERVATION))'''
+        rules = self.rules
+        observations = np.zeros((self.num_envs, len(OBSERVATION)), np.float32)
+        observations[:, 0] = self.player_x / rules.width
+        observations[:, 1] = self.player_speed / rules.player_speed
+        observations[:, 2] = self.score
+        observations[:, 3] = self.stars
+        observations[:, 4] = (rules.round_time - self.ticks / rules.tick_rate) / rules.round_time
+        observations[:, 5] = self.item_speed / rules.item_speed
+        # Lowest items first. The key y * capacity + slot is unique per session, so each max over the
+        # slots gives the lowest remaining item and its slot at once; free slots are -1.
+        capacity = len(self.active)
+        key = np.where(self.active, self.y * capacity + np.arange(capacity, dtype=np.int32)[:, None], -1)
+        envs = np.arange(self.num_envs)
+        for i in range(min(OBSERVED_ITEMS, capacity)):
+            lowest = key.max(axis=0)
+            present = lowest >= 0
+            index = np.where(present, lowest % capacity, 0) * self.num_envs + envs # Flat index of the slot
+            key.ravel()[index] = -1
+            item = observations[:, 6 + 4 * i:10 + 4 * i]
+            item[:, 0] = self.x.ravel().take(index) * (present / rules.width)
+            item[:, 1] = (lowest // capacity) * (present / rules.ground_y)
+            item[:, 2] = self.type.ravel().take(index) * present
+            item[:, 3] = present
+        return observations
+
+    def stats(self):
+        '''Aggregate throughput: session ticks per second of step() time, rounds finished and their outcomes'''
+        env_steps = self.steps * self.num_envs
+        return {'envs': self.num_envs, 'steps': self.steps, 'env_steps': env_steps,
+                'step_seconds': self.step_time,
+                'env_steps_per_s': env_steps / self.step_time if self.step_time else 0.0,
+                'rounds': self.rounds,
+                'outcomes': {name: int(count) for name, count in zip(OUTCOMES, self.outcomes) if name != 'playing'}}
+
+# Batched policies: observations in, one action per session out
+policy_rng = np.random.default_rng()
+
+def random_policy(observations):
+    return policy_rng.integers(-1, 2, size=len(observations))
+
+def chase_policy(observations, rules=None):
+    '''Steps under the lowest good or bonus item in view'''
+    rules = rules or Rules()
+    items = observations[:, 6:6 + 4 * OBSERVED_ITEMS].reshape(len(observations), OBSERVED_ITEMS, 4)
+    wanted = (items[:, :, 3] > 0) & np.isin(items[:, :, 2], (GOOD, BONUS))
+    first = np.argmax(wanted, axis=1) # Items are lowest first
+    target = items[np.arange(len(observations)), first, 0] + rules.item_size / 2 / rules.width
+    centre = observations[:, 0] + rules.player_size / 2 / rules.width
+    step = rules.player_speed / rules.width / 2
+    moves = np.where(target < centre - step, -1, np.where(target > centre + step, 1, 0))
+    return np.where(wanted.any(axis=1), moves, 0)
+
+POLICIES = {
+    'random': random_policy,
+    'chase': chase_policy,
+}
@@ -1,16 +1,35 @@
 # main.py
 
 # Libraries Initialization
+import json
+import os
 import pygame
-import random
+import queue
+import shlex
+import sqlite3
+import struct
+import subprocess
+import sys
+import threading
 import time
-from enum import Enum
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from sys import exit
+from simulation import ItemType, ITEM_VARIANTS, POLICIES, Round, Rules, SPAWNED, CAUGHT, WIN, percentile
+from replay import ReplayWriter
+from scores import ScoreStore, merge
+LAUNCH_TIME = time.perf_counter() # Reference point for time-to-first-frame
+MIXER_FREQUENCY = 44100
+MIXER_BUFFER = 512 # Samples per mixer callback; output latency is about MIXER_BUFFER / MIXER_FREQUENCY
+pygame.mixer.pre_init(MIXER_FREQUENCY, -16, 2, MIXER_BUFFER)
 pygame.init()
 
 # Define Constants
 TITLE = "Build The Cake"
-WIDTH = 1200
+BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # Asset paths are relative to this, not to the working directory
+SIM_WIDTH = 1200 # Width of the simulated play field; rounds play the same at any render resolution
+WIDTH = SIM_WIDTH # Width everything is drawn at, changed with set_resolution
 HEIGHT = WIDTH * 0.75
 MID_X = WIDTH / 2
 MID_Y = WIDTH / 2
@@ -20,78 +39,569 @@ STAR = 5 # Player starts off with 5 hearts
 SCORE = 0 # Total number of points player earns
 TIMER = 60*2 # seconds
 COUNT_DOWN_TIMER = 10 # seconds
-ITEM_SPEED = WIDTH * (3 / 350)
+ITEM_SPEED = SIM_WIDTH * (3 / 350)
 WINNING_SCORE = 50
 WINNING_STARS = 3
+ASSET_CACHE_DIR = os.path.join(BASE_DIR, '.asset_cache') # Prescaled assets written on first launch
+DIRTY_RECTS = False # Repaint only changed regions during gameplay (toggle with F2)
+SIM_RATE = 30 # Simulation ticks per second; per-tick speeds and timers are tuned for this
+SIM_STEP = 1 / SIM_RATE
+FRAME_RATE = 60 # Render cap in frames per second, 0 for uncapped
+MAX_FRAME_TIME = 0.25 # Longest frame the simulation catches up on, in seconds
+WINDOW_SIZE = (SIM_WIDTH, int(SIM_WIDTH * 0.75)) # The framebuffer is scaled to this when WIDTH differs
+SMOOTH_SCALING = False # Filter for that scale: smoothscale, or nearest neighbour when False
+AUTO_RESOLUTION = False # Lower the render width when frames go over budget, raise it when there is room
+RESOLUTIONS = (1200, 900, 600) # Render widths auto resolution picks from, highest first
+RESOLUTION_WINDOW = 90 # Frames averaged before auto resolution decides
+PRECISE_COLLISION = False # Catch only when the player's and item's opaque pixels overlap, not just their rects
+LOW_POWER = True # Once a static screen is shown, sleep until input instead of redrawing it every frame
+IDLE_TIMEOUT = 0.5 # Longest sleep while idle, in seconds
+PAUSE_FADE_FRAMES = 256 # Frames the alpha 1 pause overlay takes to fade the round out completely
+CAPTURE_DIR = 'captures' # Where F5 (or --capture) writes PNG sequences and encoder output
+CAPTURE_BUFFERS = 8 # Preallocated frames between the game thread and the capture workers
+CAPTURE_WORKERS = 2 # Threads encoding PNGs; a pipe to an encoder always gets one so frames stay in order
+CAPTURE_BLOCK = False # When every buffer is still waiting, stall the game for one instead of dropping the frame
+SCORES_PATH = 'scores.db' # SQLite score history of every round; None keeps no history
+LEADERBOARD_SIZE = 5 # Rounds listed per column of the leaderboard on the end screen
+# Encoder fed raw RGB frames on stdin for --capture-command video; {width}, {height}, {fps} and {output} are filled in
+CAPTURE_COMMAND = 'ffmpeg -loglevel error -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - -pix_fmt yuv420p {output}'
 
 paused = False
 
-class ItemType(Enum):
-    GOOD = 4
-    BAD = 6
-    BONUS = 2
-    SLOWDOWN = 1
-    SPEEDUP = 3
+def game_rules():
+    '''Simulation rules for the interactive game, built from the constants above'''
+    return Rules(width=SIM_WIDTH, tick_rate=SIM_RATE, round_time=TIMER, countdown_time=COUNT_DOWN_TIMER,
+                 item_speed=ITEM_SPEED, winning_score=WINNING_SCORE, winning_stars=WINNING_STARS,
+                 precise_collision=PRECISE_COLLISION)
 
 # Load assets
 class LoadAssets:
+    @staticmethod
+    def path(asset_path):
+        '''Where an asset path such as "assets/graphics/player3.png" is on disk, wherever the game is started from'''
+        return os.path.join(BASE_DIR, asset_path)
+
     @staticmethod
     def load_img(image_path, scale_size):
-        return pygame.transform.scale(pygame.image.load(image_path), scale_size)
+        return pygame.transform.scale(pygame.image.load(LoadAssets.path(image_path)), scale_size)
     
     @staticmethod
     def load_fonts(font_path, font_size):
-        return pygame.font.Font(font_path, int(font_size))
+        return pygame.font.Font(LoadAssets.path(font_path), int(font_size))
     
     @staticmethod
     def load_songs(sound_path):
-        return pygame.mixer.music.load(sound_path)
+        return pygame.mixer.music.load(LoadAssets.path(sound_path))
     
     @staticmethod
     def load_sound_effects(sound_path):
-        return pygame.mixer.Sound(sound_path)
+        return pygame.mixer.Sound(LoadAssets.path(sound_path))
     
     @staticmethod
     def play_sound(sound):
         sound.play()
-        
-# Loads images
-welcome_img = LoadAssets.load_img('assets/graphics/welcome2.png', (WIDTH, HEIGHT))
-instruct1_img = LoadAssets.load_img('assets/graphics/instruct1.png', (WIDTH, HEIGHT))
-instruct2_img = LoadAssets.load_img('assets/graphics/instruct2.png', (WIDTH, HEIGHT))
-instruct3_img = LoadAssets.load_img('assets/graphics/instruct3.png', (WIDTH, HEIGHT))
-instruct4_img = LoadAssets.load_img('assets/graphics/instruct4.png', (WIDTH, HEIGHT))
-instruct5_img = LoadAssets.load_img('assets/graphics/instruct5.png', (WIDTH, HEIGHT))
-background_img = LoadAssets.load_img('assets/graphics/play_screen_maybe.png', (WIDTH, HEIGHT))
-game_over_background = LoadAssets.load_img('assets/graphics/game_over_background.png', (WIDTH, HEIGHT))
-game_over_screen = LoadAssets.load_img('assets/graphics/game_over_screen2.png', (WIDTH, HEIGHT))
-game_win_screen = LoadAssets.load_img('assets/graphics/win_screen.png', (WIDTH, HEIGHT))
+
+# Background asset loading
+class AssetLoader:
+    '''Decodes assets on a small thread pool so the window opens before everything is loaded.
+       Work is keyed, so asking for the same asset twice shares one load. Anything that needs the
+       display (convert/convert_alpha) or the font engine still happens on the main thread.'''
+    executor = None
+    futures = {}
+
+    @staticmethod
+    def pool():
+        if AssetLoader.executor is None:
+            AssetLoader.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='assets')
+        return AssetLoader.executor
+
+    @staticmethod
+    def submit(key, loader, *args):
+        '''Starts loading in the background unless the same key is already queued or done'''
+        future = AssetLoader.futures.get(key)
+        if future is None:
+            future = AssetLoader.pool().submit(loader, *args)
+            AssetLoader.futures[key] = future
+        return future
+
+    @staticmethod
+    def result(key, loader, *args):
+        '''Blocks until the asset is loaded, loading it now if nobody asked for it yet'''
+        return AssetLoader.submit(key, loader, *args).result()
+
+    @staticmethod
+    def release(key):
+        '''Drops a finished load once its result has been converted and cached elsewhere,
+           so the unconverted Surface is not kept alive next to the converted one'''
+        AssetLoader.futures.pop(key, None)
+
+    @staticmethod
+    def progress(keys):
+        '''Fraction of the given keys that have finished loading; released keys count as loaded'''
+        done = sum(1 for key in keys if key not in AssetLoader.futures or AssetLoader.futures[key].done())
+        return done / len(keys) if keys else 1.0
+
+    @staticmethod
+    def shutdown():
+        if AssetLoader.executor is not None:
+            AssetLoader.executor.shutdown(wait=False, cancel_futures=True)
+            AssetLoader.executor = None
+        AssetLoader.futures.clear()
+
+# Shared sprite cache
+class SpriteCache:
+    '''Process-wide registry of converted and scaled sprites, keyed by (path, size).
+       Each variant is decoded from disk once; every later request reuses the same Surface.
+       Collision masks are cached the same way, built once per variant on first use.'''
+    surfaces = {}
+    masks = {}
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def key(image_path, scale_size):
+        return (image_path, (int(scale_size[0]), int(scale_size[1])))
+
+    @staticmethod
+    def get(image_path, scale_size):
+        key = SpriteCache.key(image_path, scale_size)
+        surface = SpriteCache.surfaces.get(key)
+        if surface is None:
+            SpriteCache.misses += 1
+            # Decode and scale may already be running on the loader pool; only the conversion is done here
+            surface = AssetLoader.result(('sprite', key), LoadAssets.load_img, image_path, key[1])
+            surface = surface.convert_alpha()
+            SpriteCache.surfaces[key] = surface
+            AssetLoader.release(('sprite', key))
+        else:
+            SpriteCache.hits += 1
+        return surface
+
+    @staticmethod
+    def get_mask(image_path, scale_size):
+        '''pygame.mask of the opaque pixels of a sprite variant. Works without a display.'''
+        key = SpriteCache.key(image_path, scale_size)
+        mask = SpriteCache.masks.get(key)
+        if mask is None:
+            surface = SpriteCache.surfaces.get(key)
+            if surface is None:
+                # Headless replays need only the mask, so the decoded Surface is not kept once it is built
+                surface = AssetLoader.result(('sprite', key), LoadAssets.load_img, image_path, key[1])
+                AssetLoader.release(('sprite', key))
+            mask = pygame.mask.from_surface(surface)
+            SpriteCache.masks[key] = mask
+        return mask
+
+    @staticmethod
+    def prefetch(image_paths, scale_size):
+        '''Queues decode and scale on the loader pool; returns the loader keys to wait on'''
+        keys = []
+        for image_path in image_paths:
+            key = SpriteCache.key(image_path, scale_size)
+            if key not in SpriteCache.surfaces:
+                AssetLoader.submit(('sprite', key), LoadAssets.load_img, image_path, key[1])
+            keys.append(('sprite', key))
+        return keys
+
+    @staticmethod
+    def preload(image_paths, scale_size):
+        '''Warm the cache so the first spawn of each variant does not hit the disk'''
+        for image_path in image_paths:
+            SpriteCache.get(image_path, scale_size)
+
+    @staticmethod
+    def memory_bytes():
+        '''Resident pixel memory of every cached Surface'''
+        return sum(surface.get_pitch() * surface.get_height() for surface in SpriteCache.surfaces.values())
+
+    @staticmethod
+    def stats():
+        return {
+            'entries': len(SpriteCache.surfaces),
+            'masks': len(SpriteCache.masks),
+            'hits': SpriteCache.hits,
+            'misses': SpriteCache.misses,
+            'bytes': SpriteCache.memory_bytes(),
+        }
+
+    @staticmethod
+    def clear():
+        SpriteCache.surfaces.clear()
+        SpriteCache.masks.clear()
+        SpriteCache.hits = 0
+        SpriteCache.misses = 0
+
+# Full-screen images, looked up by name through AssetBundle
+SCREEN_PATHS = {
+    'welcome': 'assets/graphics/welcome2.png',
+    'instruct1': 'assets/graphics/instruct1.png',
+    'instruct2': 'assets/graphics/instruct2.png',
+    'instruct3': 'assets/graphics/instruct3.png',
+    'instruct4': 'assets/graphics/instruct4.png',
+    'instruct5': 'assets/graphics/instruct5.png',
+    'background': 'assets/graphics/play_screen_maybe.png',
+    'game_over_background': 'assets/graphics/game_over_background.png',
+    'game_over': 'assets/graphics/game_over_screen2.png',
+    'game_win': 'assets/graphics/win_screen.png',
+}
+
+# Prescaled full-screen images
+class AssetBundle:
+    '''Full-screen images scaled to WIDTH x HEIGHT and converted to the display format.
+       The first launch at a resolution decodes and scales the PNGs, then writes the raw pixels
+       under ASSET_CACHE_DIR; later launches read those back and skip PNG decode and scaling.'''
+    screens = {}
+    bundle_hits = 0
+    bundle_misses = 0
+
+    @staticmethod
+    def size():
+        return (int(WIDTH), int(HEIGHT))
+
+    @staticmethod
+    def bundle_dir(size):
+        return os.path.join(ASSET_CACHE_DIR, f'screens_{size[0]}x{size[1]}')
+
+    @staticmethod
+    def read_prescaled(name, size):
+        '''Returns the unconverted, prescaled Surface for a screen, building the bundle entry if needed'''
+        source_path = SCREEN_PATHS[name]
+        bundle_path = os.path.join(AssetBundle.bundle_dir(size), name + '.rgb')
+        if os.path.exists(bundle_path) and os.path.getmtime(bundle_path) >= os.path.getmtime(LoadAssets.path(source_path)):
+            with open(bundle_path, 'rb') as f:
+                data = f.read()
+            if len(data) == size[0] * size[1] * 3: # Ignore truncated writes
+                AssetBundle.bundle_hits += 1
+                return pygame.image.frombytes(data, size, 'RGB')
+
+        AssetBundle.bundle_misses += 1
+        surface = LoadAssets.load_img(source_path, size)
+        try:
+            os.makedirs(AssetBundle.bundle_dir(size), exist_ok=True)
+            with open(bundle_path + '.tmp', 'wb') as f:
+                f.write(pygame.image.tobytes(surface, 'RGB'))
+            os.replace(bundle_path + '.tmp', bundle_path)
+        except OSError:
+            pass # A read-only install still runs, it just never gets a warm start
+        return surface
+
+    @staticmethod
+    def prefetch(name):
+        '''Starts reading a screen on the loader pool; returns the loader key to wait on'''
+        size = AssetBundle.size()
+        if name not in AssetBundle.screens:
+            AssetLoader.submit(('screen', name, size), AssetBundle.read_prescaled, name, size)
+        return ('screen', name, size)
+
+    @staticmethod
+    def load_screen(name):
+        '''Returns the display-format Surface for a screen. Needs the display to exist.'''
+        surface = AssetBundle.screens.get(name)
+        if surface is None:
+            size = AssetBundle.size()
+            surface = AssetLoader.result(('screen', name, size), AssetBundle.read_prescaled, name, size).convert()
+            AssetBundle.screens[name] = surface
+            AssetLoader.release(('screen', name, size))
+        return surface
+
+    @staticmethod
+    def load_all():
+        for name in SCREEN_PATHS:
+            AssetBundle.load_screen(name)
+
 # Font
-game_over_font = LoadAssets.load_fonts('assets/font/Pixelify_Sans/static/PixelifySans-Bold.ttf', WIDTH / 8)
-game_win_font = LoadAssets.load_fonts('assets/font/Pixelify_Sans/static/PixelifySans-Bold.ttf', WIDTH / 8)
-pixel_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (11 / 80))
-pixel_small_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (17 / 160))
-pixel_smaller_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (9 / 160))
-regular_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH / 20)
-regular_big_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH / 3)
-regular_small_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH * (7 / 160))
-press_font = LoadAssets.load_fonts('assets/font/Press/press.ttf', WIDTH * (1 / 40))
-
-# Load the music file
-game_over_sound = LoadAssets.load_sound_effects('assets/audio/over.mp3')
-game_win_sound = LoadAssets.load_sound_effects('assets/audio/win2.mp3')
-earn_sound = LoadAssets.load_sound_effects('assets/audio/earn.mp3')
-bad_sound = LoadAssets.load_sound_effects('assets/audio/trash.mp3')
-slow_item_sound = LoadAssets.load_sound_effects('assets/audio/slow_item.mp3')
-boost_sound = LoadAssets.load_sound_effects('assets/audio/soda.mp3')
-bonus_sound = LoadAssets.load_sound_effects('assets/audio/yay-6120.mp3')
-ten_sec_count_down_sound = LoadAssets.load_sound_effects('assets/audio/tensec.mp3')
-LoadAssets.load_songs('assets/audio/background_music.mp3')
-pygame.mixer.music.play(-1)  # Play in an infinite loop
+def load_fonts():
+    '''Creates every font at its size relative to WIDTH'''
+    global game_over_font, game_win_font, pixel_font, pixel_small_font, pixel_smaller_font
+    global regular_font, regular_big_font, regular_small_font, press_font, overlay_font
+    game_over_font = LoadAssets.load_fonts('assets/font/Pixelify_Sans/static/PixelifySans-Bold.ttf', WIDTH / 8)
+    game_win_font = LoadAssets.load_fonts('assets/font/Pixelify_Sans/static/PixelifySans-Bold.ttf', WIDTH / 8)
+    pixel_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (11 / 80))
+    pixel_small_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (17 / 160))
+    pixel_smaller_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH * (9 / 160))
+    regular_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH / 20)
+    regular_big_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH / 3)
+    regular_small_font = LoadAssets.load_fonts('assets/font/Roboto/Roboto-Medium.ttf', WIDTH * (7 / 160))
+    press_font = LoadAssets.load_fonts('assets/font/Press/press.ttf', WIDTH * (1 / 40))
+    overlay_font = LoadAssets.load_fonts('assets/font/VT323/VT323-Regular.ttf', WIDTH / 50)
+
+load_fonts()
 
+# Sound effects, decoded in the background and looked up by name through Sounds
+SOUND_PATHS = {
+    'game_over': 'assets/audio/over.mp3',
+    'game_win': 'assets/audio/win2.mp3',
+    'earn': 'assets/audio/earn.mp3',
+    'bad': 'assets/audio/trash.mp3',
+    'slow_item': 'assets/audio/slow_item.mp3',
+    'boost': 'assets/audio/soda.mp3',
+    'bonus': 'assets/audio/yay-6120.mp3',
+    'ten_sec_count_down': 'assets/audio/tensec.mp3',
+}
+MUSIC_PATH = 'assets/audio/background_music.mp3'
 # Set the volume (0.0 to 1.0, where 0.0 is silent and 1.0 is full volume)
 volume_level = 0.3  # Adjust this value to set the desired volume level
-pygame.mixer.music.set_volume(volume_level)
+
+# Mixer channels reserved for each category of sound, and which category each sound belongs to
+SOUND_CHANNELS = {
+    'pickup': 4,
+    'hazard': 2,
+    'countdown': 1,
+    'result': 1,
+}
+SOUND_CATEGORIES = {
+    'earn': 'pickup',
+    'bonus': 'pickup',
+    'slow_item': 'pickup',
+    'boost': 'pickup',
+    'bad': 'hazard',
+    'ten_sec_count_down': 'countdown',
+    'game_over': 'result',
+    'game_win': 'result',
+}
+RETRIGGER_WINDOW = 0.08 # Seconds in which a second trigger of the same sound is dropped
+
+class Sounds:
+    '''Sound effects decoded once to raw PCM, played on channels reserved per category.
+       The first launch decodes the MP3s and writes their samples under ASSET_CACHE_DIR; later
+       launches build the Sounds straight from those bytes. play() never waits for a decode, never
+       starts the same sound twice within RETRIGGER_WINDOW, and when all of a category's channels
+       are busy it cuts off that category's oldest sound rather than taking another category's.'''
+    channels = None # Category -> list of reserved pygame.mixer.Channel
+    started = {} # Channel -> time its current sound started
+    last_played = {} # Sound name -> time it last started
+    plays = 0
+    deduplicated = 0
+    stolen = 0
+    not_ready = 0
+    peak_busy = {}
+    cache_hits = 0
+    cache_misses = 0
+
+    @staticmethod
+    def cache_dir():
+        frequency, size, channels = pygame.mixer.get_init()
+        return os.path.join(ASSET_CACHE_DIR, f'audio_{frequency}_{size}_{channels}')
+
+    @staticmethod
+    def decode(name):
+        '''Returns the Sound for name, from the PCM cache if it is there and newer than the MP3'''
+        sound_path = SOUND_PATHS[name]
+        cache_path = os.path.join(Sounds.cache_dir(), name + '.pcm')
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(LoadAssets.path(sound_path)):
+            with open(cache_path, 'rb') as f:
+                data = f.read()
+            if data:
+                Sounds.cache_hits += 1
+                return pygame.mixer.Sound(buffer=data)
+
+        Sounds.cache_misses += 1
+        sound = LoadAssets.load_sound_effects(sound_path)
+        try:
+            os.makedirs(Sounds.cache_dir(), exist_ok=True)
+            with open(cache_path + '.tmp', 'wb') as f:
+                f.write(sound.get_raw())
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError:
+            pass # Without a writable cache every launch decodes the MP3s again
+        return sound
+
+    @staticmethod
+    def prefetch():
+        '''Queues every sound effect on the loader pool; returns the loader keys to wait on'''
+        for name in SOUND_PATHS:
+            AssetLoader.submit(('sound', name), Sounds.decode, name)
+        return [('sound', name) for name in SOUND_PATHS]
+
+    @staticmethod
+    def get(name):
+        return AssetLoader.result(('sound', name), Sounds.decode, name)
+
+    @staticmethod
+    def reserve_channels():
+        '''Reserves the first channels of the mixer for the categories in SOUND_CHANNELS'''
+        total = sum(SOUND_CHANNELS.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+        pygame.mixer.set_reserved(total)
+        Sounds.channels = {}
+        index = 0
+        for category, count in SOUND_CHANNELS.items():
+            Sounds.channels[category] = [pygame.mixer.Channel(index + i) for i in range(count)]
+            index += count
+
+    @staticmethod
+    def play(name):
+        '''Starts a sound effect without blocking; returns the channel, or None if it was dropped'''
+        now = time.perf_counter()
+        if now - Sounds.last_played.get(name, -RETRIGGER_WINDOW) < RETRIGGER_WINDOW:
+            Sounds.deduplicated += 1
+            return None
+        future = AssetLoader.submit(('sound', name), Sounds.decode, name)
+        if not future.done():
+            Sounds.not_ready += 1 # Still decoding; skipping it beats stalling the frame
+            return None
+        if Sounds.channels is None:
+            Sounds.reserve_channels()
+
+        category = SOUND_CATEGORIES[name]
+        channels = Sounds.channels[category]
+        free = [channel for channel in channels if not channel.get_busy()]
+        if free:
+            channel = free[0]
+        else:
+            channel = min(channels, key=lambda channel: Sounds.started.get(channel, 0))
+            Sounds.stolen += 1
+        channel.play(future.result())
+        Sounds.started[channel] = now
+        Sounds.last_played[name] = now
+        Sounds.plays += 1
+        busy = len(channels) - len(free) + 1 if free else len(channels)
+        Sounds.peak_busy[category] = max(Sounds.peak_busy.get(category, 0), busy)
+        return channel
+
+    @staticmethod
+    def busy():
+        '''Category -> number of its channels playing right now'''
+        if Sounds.channels is None:
+            return {category: 0 for category in SOUND_CHANNELS}
+        return {category: sum(1 for channel in channels if channel.get_busy())
+                for category, channels in Sounds.channels.items()}
+
+    @staticmethod
+    def latency_ms():
+        '''Time one mixer buffer takes to play, the delay between play() and hearing it'''
+        frequency = pygame.mixer.get_init()[0]
+        return MIXER_BUFFER / frequency * 1000
+
+    @staticmethod
+    def stats():
+        return {
+            'plays': Sounds.plays,
+            'deduplicated': Sounds.deduplicated,
+            'stolen': Sounds.stolen,
+            'not_ready': Sounds.not_ready,
+            'busy': Sounds.busy(),
+            'peak_busy': dict(Sounds.peak_busy),
+            'channels': dict(SOUND_CHANNELS),
+            'latency_ms': Sounds.latency_ms(),
+            'cache_hits': Sounds.cache_hits,
+            'cache_misses': Sounds.cache_misses,
+        }
+
+    @staticmethod
+    def start_music():
+        LoadAssets.load_songs(MUSIC_PATH)
+        pygame.mixer.music.play(-1)  # Play in an infinite loop
+        pygame.mixer.music.set_volume(volume_level)
+
+# Keys for each action; rebind with Input.bind or a JSON file passed to --bindings
+KEY_BINDINGS = {
+    'left': [pygame.K_LEFT],
+    'right': [pygame.K_RIGHT],
+    'pause': [pygame.K_SPACE],
+    'quit': [pygame.K_ESCAPE, pygame.K_q, pygame.K_l],
+    'restart': [pygame.K_RETURN],
+    'dirty_rects': [pygame.K_F2],
+    'profiler': [pygame.K_F3],
+    'trace': [pygame.K_F4],
+    'capture': [pygame.K_F5],
+}
+INPUT_EVENTS = [pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP] # Everything else is dropped before it is queued
+REDRAW_EVENTS = [pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED] # The window needs repainting, e.g. after being uncovered
+
+class Input:
+    '''Keyboard input by action. The event queue only takes INPUT_EVENTS, so mouse motion and the
+       like never reach the game loop; movement is read from the key state once per simulation tick.
+       Input-to-photon latency runs from the frame that polled a key press to the end of the display
+       push of the first frame that acted on it (Profiler phase 'input_latency').'''
+    bindings = {action: list(keys) for action, keys in KEY_BINDINGS.items()}
+    pending = None # perf_counter time a key press was polled, until a frame shows its effect
+    consumed = False # Something acted on a key press since the last frame was presented
+    latencies = deque(maxlen=300) # Milliseconds, most recent key presses
+
+    @staticmethod
+    def install():
+        '''Sets the event filter; call once the display exists'''
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(INPUT_EVENTS + REDRAW_EVENTS)
+
+    @staticmethod
+    def bind(action, keys):
+        '''Replaces the keys for an action, e.g. Input.bind('left', [pygame.K_a, pygame.K_LEFT])'''
+        if action not in Input.bindings:
+            raise KeyError(f'unknown action {action!r}, expected one of {sorted(Input.bindings)}')
+        Input.bindings[action] = list(keys)
+
+    @staticmethod
+    def load_bindings(path):
+        '''Rebinds from JSON such as {"left": ["a", "left"], "right": ["d", "right"]}, using pygame key names'''
+        with open(path) as f:
+            bindings = json.load(f)
+        for action, names in bindings.items():
+            Input.bind(action, [pygame.key.key_code(name) for name in names])
+
+    @staticmethod
+    def poll(timeout=None):
+        '''The frame's events; notes when the first key press arrived. With a timeout in seconds and
+           nothing queued, sleeps until the next event arrives or the timeout passes.'''
+        events = pygame.event.get()
+        if not events and timeout:
+            event = pygame.event.wait(int(timeout * 1000))
+            if event.type != pygame.NOEVENT:
+                events = [event] + pygame.event.get()
+        if Input.pending is None:
+            for event in events:
+                if event.type == pygame.KEYDOWN:
+                    Input.pending = time.perf_counter()
+                    break
+        return events
+
+    @staticmethod
+    def triggered(event, action=None):
+        '''True if event is a key press bound to action, or any key press when action is None'''
+        if event.type != pygame.KEYDOWN:
+            return False
+        if action is not None and event.key not in Input.bindings[action]:
+            return False
+        Input.consumed = True
+        return True
+
+    @staticmethod
+    def held(keys, action):
+        return any(keys[key] for key in Input.bindings[action])
+
+    @staticmethod
+    def direction():
+        '''-1, 0 or 1 from the movement keys held right now; called once per tick'''
+        keys = pygame.key.get_pressed()
+        move = Input.held(keys, 'right') - Input.held(keys, 'left')
+        if move:
+            Input.consumed = True
+        return move
+
+    @staticmethod
+    def presented():
+        '''Called after each display push to close the latency measurement of a pending key press'''
+        if Input.pending is not None:
+            now = time.perf_counter()
+            if Input.consumed:
+                Input.latencies.append((now - Input.pending) * 1000)
+                if Profiler.enabled:
+                    Profiler.add('input_latency', Input.pending, now)
+                Input.pending = None
+            elif now - Input.pending > MAX_FRAME_TIME:
+                Input.pending = None # A key nothing is bound to
+        Input.consumed = False
+
+    @staticmethod
+    def stats():
+        samples = sorted(Input.latencies)
+        return {
+            'presses': len(samples),
+            'latency_p50_ms': percentile(samples, 0.5),
+            'latency_p95_ms': percentile(samples, 0.95),
+            'bindings': {action: [pygame.key.name(key) for key in keys] for action, keys in Input.bindings.items()},
+        }
 
 # GameEntity as Parent Class
 class GameEntity(pygame.sprite.Sprite):
@@ -103,11 +613,25 @@ class GameEntity(pygame.sprite.Sprite):
             + speed: a number that references the width in scale_size
         '''
         super().__init__()
-        self.image = pygame.image.load(image_path).convert_alpha()
-        self.image = pygame.transform.scale(self.image, scale_size)
+        self.image = SpriteCache.get(image_path, scale_size)
+        self.image_key = SpriteCache.key(image_path, scale_size)
         self.rect = self.image.get_rect()
         self.rect.topleft = position
+        self.previous_position = self.rect.topleft # Position at the start of the current tick
         self.speed = speed
+
+    @property
+    def mask(self):
+        '''Collision mask of the current image, shared with every sprite of the same variant'''
+        return SpriteCache.get_mask(*self.image_key)
+
+    def remember_position(self):
+        self.previous_position = self.rect.topleft
+
+    def interpolated_position(self, alpha):
+        '''Position between the last two ticks, alpha in [0, 1]'''
+        x, y = self.previous_position
+        return (x + (self.rect.x - x) * alpha, y + (self.rect.y - y) * alpha)
         
     def move_right(self):
         self.rect.x += self.speed
@@ -123,80 +647,612 @@ class GameEntity(pygame.sprite.Sprite):
         
 # Player as Child Class of GameEntity
 class Player(GameEntity):
+    IMAGE_PATH = "assets/graphics/player3.png"
+
     def __init__(self, position, scale_size, speed):
-        super().__init__("assets/graphics/player3.png", position, scale_size, speed)
+        super().__init__(Player.IMAGE_PATH, position, scale_size, speed)
     
-    def update_position(self, keys):
-        if not paused:
-            '''Handles player's movement'''
-            if keys[pygame.K_LEFT] and self.rect.left > 0: # Check left boundary
-                self.move_left()
-            if keys[pygame.K_RIGHT] and self.rect.right < WIDTH: # Check right boundary
-                self.move_right()
-            if self.rect.left < 0:
-                self.rect.x = 0
-            if self.rect.right > WIDTH:
-                self.rect.x = WIDTH - self.rect.width
-            
+
 # CollisionManager class to handle collision checks
 class CollisionManager:
+    precise_tests = 0 # Rect overlaps that went on to the mask test
+    precise_hits = 0 # Mask tests that found overlapping pixels
+
     @staticmethod
     def check_collision(sprite1, sprite2):
         '''Check collision between two sprites'''
         return pygame.sprite.collide_rect(sprite1, sprite2)
+
+    @staticmethod
+    def check_precise_collision(sprite1, sprite2):
+        '''Rect test first; only overlapping rects pay for the mask test'''
+        if not pygame.sprite.collide_rect(sprite1, sprite2):
+            return False
+        return CollisionManager.count_precise(pygame.sprite.collide_mask(sprite1, sprite2) is not None)
+
+    @staticmethod
+    def precise_catch(player, item):
+        '''Round.collide hook for rules with precise_collision: the simulated player and item,
+           already known to overlap as rects, also have to overlap in their masks'''
+        player_mask = SpriteCache.get_mask(Player.IMAGE_PATH, (player.size, player.size))
+        item_mask = SpriteCache.get_mask(Item.image_path(item.type, item.variant), (item.size, item.size))
+        offset = (int(item.x) - int(player.x), int(item.y) - int(player.y))
+        return CollisionManager.count_precise(player_mask.overlap(item_mask, offset) is not None)
+
+    @staticmethod
+    def count_precise(hit):
+        CollisionManager.precise_tests += 1
+        if hit:
+            CollisionManager.precise_hits += 1
+        return hit
+
+    @staticmethod
+    def stats():
+        return {
+            'precise_tests': CollisionManager.precise_tests,
+            'precise_hits': CollisionManager.precise_hits,
+            'rejected': CollisionManager.precise_tests - CollisionManager.precise_hits,
+            'masks': len(SpriteCache.masks),
+        }
     
 # Item as Child Class of GameEntity
 class Item(GameEntity):
+    SIZE = (WIDTH // 12, WIDTH // 12)
+
     def __init__(self, type, image_path, position, scale_size, speed):
         super().__init__(image_path, position, scale_size, speed)
         self.type = type
-        
-    @staticmethod 
-    def spawn_item():
-        # Spawn a new item with random type, position, and speed
-        item_types = [ItemType.GOOD] * 4 + [ItemType.BAD] * 4 + [ItemType.BONUS] * 1 + [ItemType.SLOWDOWN] * 1 + [ItemType.SPEEDUP] * 1
-        chosen_type = random.choice(item_types)
-        if chosen_type == ItemType.GOOD:
-            image_path = f'assets/graphics/{chosen_type.name}/{random.randint(1, ItemType.GOOD.value)}.png'
-        elif chosen_type == ItemType.BAD:
-            image_path = f'assets/graphics/{chosen_type.name}/{random.randint(1, ItemType.BAD.value)}.png'
-        elif chosen_type == ItemType.BONUS:
-            image_path = f'assets/graphics/{chosen_type.name}/{random.randint(1, ItemType.BONUS.value)}.png'
-        elif chosen_type == ItemType.SLOWDOWN:
-            image_path = f'assets/graphics/{chosen_type.name}/1.png'
-        elif chosen_type == ItemType.SPEEDUP:
-            image_path = f'assets/graphics/{chosen_type.name}/1.png'
-            
-        new_item = Item(chosen_type, image_path, 
-                       (random.randint(0, WIDTH - WIDTH // 12), 0), 
-                       (WIDTH // 12, WIDTH // 12), 
-                       (ITEM_SPEED))
-        
-        if new_item.type == ItemType.BAD:
-            new_item.speed -= 0.3
-            
-        return new_item  
-    
-    def update_score_and_play_sound_effects(self):
-        global SCORE, STAR
-        '''Update score based on item type'''
+
+    @staticmethod
+    def image_path(item_type, variant):
+        return f'assets/graphics/{item_type.name}/{variant}.png'
+
+    @staticmethod
+    def image_paths():
+        '''Every item sprite the spawner can pick'''
+        return [Item.image_path(item_type, i)
+                for item_type, count in ITEM_VARIANTS.items()
+                for i in range(1, count + 1)]
+
+    def reset(self, type, image_path, position, speed):
+        '''Turns a recycled sprite into a new item without allocating'''
+        self.type = type
+        self.image = SpriteCache.get(image_path, Item.SIZE)
+        self.image_key = SpriteCache.key(image_path, Item.SIZE)
+        self.rect.size = self.image.get_size()
+        self.rect.topleft = position
+        self.previous_position = self.rect.topleft
+        self.speed = speed
+
+    def play_sound_effect(self):
+        '''Sound for catching this item; the score itself is kept by the simulation'''
         if self.type == ItemType.GOOD:
-            earn_sound.play()
-            SCORE += 1
+            Sounds.play('earn')
         elif self.type == ItemType.BONUS:
-            bonus_sound.play()
-            SCORE += 3
+            Sounds.play('bonus')
         elif self.type == ItemType.BAD:
-            bad_sound.play()
-            STAR -= 0.5
+            Sounds.play('bad')
         elif self.type == ItemType.SLOWDOWN:
-            slow_item_sound.play()
-            STAR -= 1
+            Sounds.play('slow_item')
         elif self.type == ItemType.SPEEDUP:
-            boost_sound.play()
+            Sounds.play('boost')
+
+# Item sprite pool
+class ItemPool:
+    '''Recycles Item sprites instead of allocating one per spawn.
+       Active sprites remember their index in the active list, so release is a swap and a pop.'''
+    def __init__(self):
+        self.active = []
+        self.free = []
+        self.allocations = 0 # Sprites ever created
+        self.reuses = 0 # Acquires served from the free list
+        self.peak_active = 0
+
+    def acquire(self, type, image_path, position, speed):
+        if self.free:
+            item = self.free.pop()
+            item.reset(type, image_path, position, speed)
+            self.reuses += 1
+        else:
+            item = Item(type, image_path, position, Item.SIZE, speed)
+            self.allocations += 1
+        item.pool_index = len(self.active)
+        self.active.append(item)
+        self.peak_active = max(self.peak_active, len(self.active))
+        return item
+
+    def release(self, item):
+        index = item.pool_index
+        last = self.active.pop()
+        if last is not item:
+            self.active[index] = last
+            last.pool_index = index
+        item.pool_index = None
+        self.free.append(item)
+
+    def release_all(self):
+        for item in self.active:
+            item.pool_index = None
+        self.free.extend(self.active)
+        self.active.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.active) + len(self.free),
+            'active': len(self.active),
+            'free': len(self.free),
+            'peak_active': self.peak_active,
+            'allocations': self.allocations,
+            'reuses': self.reuses,
+        }
+
+item_pool = ItemPool()
+
+# Text rendering
+class TextCache:
+    '''Bounded LRU of rendered text keyed by (font, text, colour, antialias).
+       Numbers go through a per-font digit atlas, so a changing score or countdown is composed
+       from glyphs that were rasterised once instead of being rendered again.'''
+    MAX_ENTRIES = 64
+    surfaces = OrderedDict()
+    digit_atlases = {}
+    hits = 0
+    misses = 0
+    rasterised = 0 # Calls that reached Font.render
+    composed = 0 # Numbers built from the digit atlas
+
+    @staticmethod
+    def lookup(key):
+        surface = TextCache.surfaces.get(key)
+        if surface is not None:
+            TextCache.surfaces.move_to_end(key)
+            TextCache.hits += 1
+        else:
+            TextCache.misses += 1
+        return surface
+
+    @staticmethod
+    def store(key, surface):
+        TextCache.surfaces[key] = surface
+        if len(TextCache.surfaces) > TextCache.MAX_ENTRIES:
+            TextCache.surfaces.popitem(last=False)
+        return surface
+
+    @staticmethod
+    def render(font, text, antialias, color):
+        '''Same arguments as Font.render; returns a shared Surface that must not be modified'''
+        key = (font, text, tuple(color), antialias)
+        surface = TextCache.lookup(key)
+        if surface is None:
+            TextCache.rasterised += 1
+            surface = TextCache.store(key, font.render(text, antialias, color))
+        return surface
+
+    @staticmethod
+    def digits(font, antialias, color):
+        key = (font, tuple(color), antialias)
+        atlas = TextCache.digit_atlases.get(key)
+        if atlas is None:
+            atlas = {digit: font.render(digit, antialias, color) for digit in '0123456789-'}
+            TextCache.rasterised += len(atlas)
+            TextCache.digit_atlases[key] = atlas
+        return atlas
+
+    @staticmethod
+    def render_number(font, prefix, value, antialias, color):
+        '''Renders prefix + str(value), composing the digits from the atlas on a miss'''
+        text = prefix + str(value)
+        key = (font, text, tuple(color), antialias)
+        surface = TextCache.lookup(key)
+        if surface is not None:
+            return surface
+
+        atlas = TextCache.digits(font, antialias, color)
+        parts = [atlas[digit] for digit in str(value)]
+        if prefix:
+            parts.insert(0, TextCache.render(font, prefix, antialias, color))
+        surface = pygame.Surface((sum(part.get_width() for part in parts),
+                                  max(part.get_height() for part in parts)), pygame.SRCALPHA)
+        x = 0
+        for part in parts:
+            # Glyphs never overlap, so a max blend onto the transparent surface copies them exactly
+            surface.blit(part, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            x += part.get_width()
+        TextCache.composed += 1
+        return TextCache.store(key, surface)
+
+    @staticmethod
+    def stats():
+        lookups = TextCache.hits + TextCache.misses
+        return {
+            'entries': len(TextCache.surfaces),
+            'hits': TextCache.hits,
+            'misses': TextCache.misses,
+            'hit_rate': TextCache.hits / lookups if lookups else 0.0,
+            'rasterised': TextCache.rasterised,
+            'composed': TextCache.composed,
+        }
+
+    @staticmethod
+    def clear():
+        TextCache.surfaces.clear()
+        TextCache.digit_atlases.clear()
+
+# Frame-time profiling
+class NullSection:
+    '''Context manager that does nothing, handed out while profiling is off'''
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+class ProfileSection:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        Profiler.add(self.name, self.start, time.perf_counter())
+        return False
+
+class Profiler:
+    '''Times the phases of each frame and keeps the last WINDOW frames for p50/p95/p99.
+       Toggle with F3 (also shows the overlay); F4 starts and stops a Chrome trace
+       (open the JSON in chrome://tracing or Perfetto). While disabled, section() returns a
+       shared no-op, so instrumented code costs one attribute check per phase.'''
+    WINDOW = 300 # Frames kept for percentiles
+    OVERLAY_REFRESH = 15 # Frames between overlay text updates
+    enabled = False
+    overlay = False
+    history = {} # Phase -> deque of milliseconds per frame
+    frame = {} # Phase -> seconds spent in the current frame
+    trace_events = None # Chrome trace events while recording, otherwise None
+    null_section = NullSection()
+    overlay_surface = None
+    frames_since_overlay = 0
+
+    @staticmethod
+    def section(name):
+        if not Profiler.enabled:
+            return Profiler.null_section
+        return ProfileSection(name)
+
+    @staticmethod
+    def add(name, start, end):
+        Profiler.frame[name] = Profiler.frame.get(name, 0) + end - start
+        if Profiler.trace_events is not None:
+            Profiler.trace_events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                                          'ts': start * 1e6, 'dur': (end - start) * 1e6})
+
+    @staticmethod
+    def end_frame():
+        for name, seconds in Profiler.frame.items():
+            if name not in Profiler.history:
+                Profiler.history[name] = deque(maxlen=Profiler.WINDOW)
+            Profiler.history[name].append(seconds * 1000)
+        Profiler.frame.clear()
+
+    @staticmethod
+    def toggle():
+        Profiler.enabled = not Profiler.enabled
+        Profiler.overlay = Profiler.enabled
+        Profiler.history.clear()
+        Profiler.frame.clear()
+        Profiler.overlay_surface = None
+
+    @staticmethod
+    def percentiles(name):
+        '''(p50, p95, p99) in milliseconds over the recent frames'''
+        samples = sorted(Profiler.history.get(name, ()))
+        return (percentile(samples, 0.5), percentile(samples, 0.95), percentile(samples, 0.99))
+
+    @staticmethod
+    def report():
+        return {name: Profiler.percentiles(name) for name in sorted(Profiler.history)}
+
+    @staticmethod
+    def render_overlay(screen):
+        '''Draws the percentile table in the bottom-left corner; the text is refreshed every few frames'''
+        Profiler.frames_since_overlay += 1
+        if Profiler.overlay_surface is None or Profiler.frames_since_overlay >= Profiler.OVERLAY_REFRESH:
+            Profiler.frames_since_overlay = 0
+            lines = [f"{'phase':<18}{'p50':>7}{'p95':>7}{'p99':>7}"]
+            lines += [f'{name:<18}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f}' for name, (p50, p95, p99) in Profiler.report().items()]
+            line_height = overlay_font.get_linesize()
+            surface = pygame.Surface((WIDTH // 3, line_height * len(lines) + 10))
+            surface.set_alpha(200)
+            for i, line in enumerate(lines):
+                # Digits change every refresh, so this text deliberately bypasses TextCache
+                surface.blit(overlay_font.render(line, False, (255, 255, 255)), (5, 5 + i * line_height))
+            Profiler.overlay_surface = surface
+        screen.blit(Profiler.overlay_surface, (0, HEIGHT - Profiler.overlay_surface.get_height()))
+
+    @staticmethod
+    def start_trace():
+        Profiler.trace_events = []
+
+    @staticmethod
+    def save_trace(path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': Profiler.trace_events or [], 'displayTimeUnit': 'ms'}, f)
+        Profiler.trace_events = None
+        print(f"Trace written to {path}")
+
+# Dirty-rectangle rendering
+class DirtyRectRenderer:
+    '''Repaints only the parts of the screen that changed since the previous frame.
+       Each frame is described as a layered list of (key, surface, position); an entry whose key and
+       rect match last frame is left alone unless something changed underneath or on top of it.'''
+    def __init__(self, background):
+        self.background = background
+        self.previous = None # Entries drawn last frame; None forces a full repaint
+
+    def invalidate(self):
+        '''Call whenever something else drew on the screen'''
+        self.previous = None
+
+    def draw(self, screen, draws):
+        '''Draws the frame and returns the rects to pass to pygame.display.update'''
+        entries = [(key, pygame.Rect(position, surface.get_size()), surface) for key, surface, position in draws]
+        current = {(key, tuple(rect)) for key, rect, _ in entries}
+
+        if self.previous is None:
+            screen.blit(self.background, (0, 0))
+            for _, rect, surface in entries:
+                screen.blit(surface, rect)
+            self.previous = current
+            return [screen.get_rect()]
+
+        # Regions that appeared, disappeared or moved
+        dirty = [pygame.Rect(rect) for key, rect in self.previous - current]
+        redraw = [(key, tuple(rect)) not in self.previous for key, rect, _ in entries]
+        dirty += [rect for (_, rect, _), changed in zip(entries, redraw) if changed]
+        # An unchanged entry that overlaps a dirty region gets erased too, so it has to be redrawn
+        grown = True
+        while grown:
+            grown = False
+            for i, (_, rect, _) in enumerate(entries):
+                if not redraw[i] and rect.collidelist(dirty) != -1:
+                    redraw[i] = True
+                    dirty.append(rect)
+                    grown = True
+
+        for rect in dirty:
+            screen.blit(self.background, rect, rect)
+        for (_, rect, surface), changed in zip(entries, redraw):
+            if changed:
+                screen.blit(surface, rect)
+        self.previous = current
+        return dirty
+
+    @staticmethod
+    def covered_area(rects, bounds):
+        '''Pixels of bounds covered by at least one of the rects, counting overlapping regions once'''
+        rects = [rect.clip(bounds) for rect in rects]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        if all(rect.collidelist(rects[i + 1:]) == -1 for i, rect in enumerate(rects)):
+            return sum(rect.width * rect.height for rect in rects)
+        # Cut the rects into vertical slabs at every left and right edge, then merge the spans in each slab
+        edges = sorted({x for rect in rects for x in (rect.left, rect.right)})
+        area = 0
+        for left, right in zip(edges, edges[1:]):
+            spans = sorted((rect.top, rect.bottom) for rect in rects if rect.left <= left and rect.right >= right)
+            reach = bounds.top
+            for top, bottom in spans:
+                if bottom > reach:
+                    area += (bottom - max(top, reach)) * (right - left)
+                    reach = bottom
+        return area
+
+# Gameplay capture
+class Capture:
+    '''Records what the game draws to a PNG sequence or pipes raw frames to an encoder, off the game thread.
+       The game thread only copies the frame into the next free buffer of a ring of CAPTURE_BUFFERS
+       preallocated Surfaces (a same-format blit) and queues it. Worker threads convert it to RGB,
+       compress it with zlib or write it to the encoder's stdin, all of which release the GIL, and hand
+       the buffer back. When every buffer is still queued the frame is dropped and counted, or with
+       CAPTURE_BLOCK the game waits for a buffer instead. Toggle with F5.'''
+    PNG_LEVEL = 3 # zlib level; higher is barely smaller for game frames and much slower
+    ROWS_PER_CHUNK = 64 # Rows joined per zlib call, which bounds how long a worker holds the GIL
+    active = False
+    base = CAPTURE_DIR # Directory sessions are written under
+    directory = None # PNG sequence directory of this session, or None when piping to an encoder
+    command = None # Encoder command line template, None for a PNG sequence
+    fps = FRAME_RATE
+    process = None
+    size = None
+    free = None # Buffers the game thread may fill
+    pending = None # (frame number, buffer) waiting for a worker; None tells a worker to stop
+    workers = []
+    sessions = 0
+    frames = 0 # Frames offered while active
+    captured = 0
+    written = 0
+    dropped = 0
+    failed = None # First error a worker hit; capture stops when there is one
+    blocked = 0.0 # Seconds the game thread waited for a buffer under CAPTURE_BLOCK
+    peak_queued = 0
+    copy_ms = deque(maxlen=300)
+    lock = threading.Lock() # Guards written, which every worker counts
+
+    @staticmethod
+    def start(screen, fps, directory=None, command=None):
+        '''Starts a capture session of frames the size of screen. Without a command, PNGs go to a new
+           directory under directory (CAPTURE_DIR); with one, it is run with raw RGB frames on stdin.
+           If the encoder cannot be started, says why and leaves capture off.'''
+        if Capture.active:
+            Capture.stop()
+        name = time.strftime('capture-%Y%m%d-%H%M%S') + f'-{Capture.sessions + 1}'
+        base = Capture.base = directory or Capture.base
+        os.makedirs(base, exist_ok=True)
+        Capture.command = command
+        if command is not None:
+            width, height = screen.get_size()
+            args = shlex.split(command.format(width=width, height=height, fps=fps or FRAME_RATE,
+                                              output=os.path.join(base, name + '.mp4')))
+            try:
+                Capture.process = subprocess.Popen(args, stdin=subprocess.PIPE)
+            except OSError as error: # e.g. ffmpeg is not installed
+                Capture.failed = error
+                print(f'Capture failed: {error}')
+                return
+        Capture.sessions += 1
+        Capture.frames = Capture.captured = Capture.written = Capture.dropped = Capture.peak_queued = 0
+        Capture.blocked = 0.0
+        Capture.copy_ms.clear()
+        Capture.size = screen.get_size()
+        Capture.fps = fps or FRAME_RATE
+        if command is None:
+            Capture.directory = os.path.join(base, name)
+            os.makedirs(Capture.directory)
+            Capture.process = None
+            workers = CAPTURE_WORKERS
+        else:
+            Capture.directory = None
+            workers = 1
+        Capture.free = queue.Queue()
+        for _ in range(CAPTURE_BUFFERS):
+            Capture.free.put(pygame.Surface(Capture.size, 0, screen))
+        Capture.pending = queue.Queue()
+        Capture.failed = None
+        Capture.workers = [threading.Thread(target=Capture.work, name=f'capture-{i}', daemon=True)
+                           for i in range(workers)]
+        for worker in Capture.workers:
+            worker.start()
+        Capture.active = True
+
+    @staticmethod
+    def stop():
+        '''Finishes writing every frame already captured and closes the encoder'''
+        if not Capture.active:
+            return
+        Capture.active = False
+        for _ in Capture.workers:
+            Capture.pending.put(None)
+        for worker in Capture.workers:
+            worker.join()
+        Capture.workers = []
+        if Capture.process is not None:
+            try:
+                Capture.process.stdin.close()
+            except OSError:
+                pass # The encoder already exited; failed says why
+            Capture.process.wait()
+            Capture.process = None
+        print(f"Capture stopped: {Capture.stats()}")
+
+    @staticmethod
+    def toggle(screen, fps):
+        if Capture.active:
+            Capture.stop()
+        else:
+            Capture.start(screen, fps, Capture.base, Capture.command)
+
+    @staticmethod
+    def frame(screen):
+        '''Called on the game thread once per presented frame: copies it into a free buffer and queues it'''
+        if Capture.failed is not None:
+            print(f'Capture failed: {Capture.failed}')
+            Capture.stop()
+            return
+        if screen.get_size() != Capture.size:
+            Capture.start(screen, Capture.fps, Capture.base, Capture.command) # The resolution changed; continue in a new session
+            if not Capture.active:
+                return
+        Capture.frames += 1
+        start = time.perf_counter()
+        try:
+            buffer = Capture.free.get_nowait()
+        except queue.Empty:
+            if not CAPTURE_BLOCK:
+                Capture.dropped += 1
+                return
+            buffer = Capture.free.get()
+            Capture.blocked += time.perf_counter() - start
+            start = time.perf_counter()
+        buffer.blit(screen, (0, 0))
+        Capture.pending.put((Capture.captured, buffer))
+        Capture.captured += 1
+        Capture.peak_queued = max(Capture.peak_queued, Capture.pending.qsize())
+        Capture.copy_ms.append((time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def work():
+        '''Worker thread: encodes queued frames until told to stop'''
+        rgb = pygame.Surface(Capture.size, 0, 24, (0xFF, 0xFF00, 0xFF0000, 0) if sys.byteorder == 'little'
+                             else (0xFF0000, 0xFF00, 0xFF, 0)) # R, G, B byte order, as PNG and rgb24 want
+        while True:
+            item = Capture.pending.get()
+            if item is None:
+                return
+            number, buffer = item
+            try:
+                if Capture.failed is None:
+                    rgb.blit(buffer, (0, 0))
+                    Capture.encode(rgb, number)
+                    with Capture.lock:
+                        Capture.written += 1
+            except (OSError, ValueError, pygame.error) as error:
+                Capture.failed = Capture.failed or error
+            finally:
+                Capture.free.put(buffer)
+
+    @staticmethod
+    def encode(rgb, number):
+        '''Writes one frame; the row views lock rgb, so they must all be gone before its next blit'''
+        rows = Capture.rows(rgb)
+        if Capture.process is None:
+            Capture.write_png(os.path.join(Capture.directory, f'frame-{number:06d}.png'), rgb.get_size(), rows)
+        else:
+            Capture.process.stdin.write(b''.join(rows))
+
+    @staticmethod
+    def rows(surface):
+        '''The pixel rows of a 24-bit surface without the padding at the end of each'''
+        view = memoryview(surface.get_view('0')).cast('B')
+        pitch, length = surface.get_pitch(), surface.get_width() * 3
+        return [view[y * pitch:y * pitch + length] for y in range(surface.get_height())]
+
+    @staticmethod
+    def write_png(path, size, rows):
+        '''Writes an 8-bit RGB PNG with no row filtering, compressing ROWS_PER_CHUNK rows per zlib call'''
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)))
+        compressor = zlib.compressobj(Capture.PNG_LEVEL)
+        parts = []
+        for start in range(0, len(rows), Capture.ROWS_PER_CHUNK):
+            # Every row starts with its filter type, 0 for none
+            parts.append(compressor.compress(b'\x00' + b'\x00'.join(rows[start:start + Capture.ROWS_PER_CHUNK])))
+        parts.append(compressor.flush())
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', size[0], size[1], 8, 2, 0, 0, 0)))
+            f.write(chunk(b'IDAT', b''.join(parts)))
+            f.write(chunk(b'IEND', b''))
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def stats():
+        samples = sorted(Capture.copy_ms)
+        return {
+            'frames': Capture.frames,
+            'captured': Capture.captured,
+            'written': Capture.written,
+            'dropped': Capture.dropped,
+            'blocked_ms': Capture.blocked * 1000,
+            'peak_queued': Capture.peak_queued,
+            'copy_p50_ms': percentile(samples, 0.5),
+            'copy_p95_ms': percentile(samples, 0.95),
+        }
 
 # GameState classes
 class GameState:
+    animated = True # False for states that draw the same frame until they handle an event
     def __init__(self, game):
         self.game = game
     def handle_events(self, events):
@@ -207,78 +1263,104 @@ class GameState:
         pass
     def render_paused(self, screen):
         pass
+    def paused_still(self):
+        '''True once further render_paused calls would not change the screen'''
+        return True
+    def view_key(self):
+        '''Anything besides the state itself that changes the picture of a state that is not animated'''
+        return None
+    def resize(self):
+        '''Called after set_resolution; states holding sized surfaces rebuild them here'''
+        pass
     
 class MainMenuState(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
+        AssetBundle.prefetch('instruct1')
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
+            elif Input.triggered(event):
                 self.game.state = Instruction1(self.game)
                 
     def render(self, screen):
-        screen.blit(welcome_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('welcome'), (0, 0))
 
 class Instruction1(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
+        AssetBundle.prefetch('instruct2')
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
+            elif Input.triggered(event):
                 self.game.state = Instruction2(self.game)
                 
     def render(self, screen):
-        screen.blit(instruct1_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('instruct1'), (0, 0))
 
 class Instruction2(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
+        AssetBundle.prefetch('instruct3')
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
+            elif Input.triggered(event):
                 self.game.state = Instruction3(self.game)
                 
     def render(self, screen):
-        screen.blit(instruct2_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('instruct2'), (0, 0))
 
 class Instruction3(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
+        AssetBundle.prefetch('instruct4')
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
+            elif Input.triggered(event):
                 self.game.state = Instruction4(self.game)
                 
     def render(self, screen):
-        screen.blit(instruct3_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('instruct3'), (0, 0))
         
 class Instruction4(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
+        AssetBundle.prefetch('instruct5')
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
+            elif Input.triggered(event):
                 self.game.state = Instruction5(self.game)
                 
     def render(self, screen):
-        screen.blit(instruct4_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('instruct4'), (0, 0))
         
 class Instruction5(GameState):
+    animated = False
+
     def __init__(self, game):
         super().__init__(game)
         
@@ -286,150 +1368,170 @@ class Instruction5(GameState):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
-                self.game.state = GamePlayState(self.game)
+            elif Input.triggered(event):
+                LoadingState.enter(self.game, GamePlayState.prefetch_assets(), GamePlayState)
                 
     def render(self, screen):
-        screen.blit(instruct5_img, (0, 0))
+        screen.blit(AssetBundle.load_screen('instruct5'), (0, 0))
+
+class LoadingState(GameState):
+    '''Shown while the assets of the next state are still loading in the background'''
+    def __init__(self, game, keys, next_state):
+        super().__init__(game)
+        self.keys = keys
+        self.next_state = next_state
+
+    @staticmethod
+    def enter(game, keys, next_state):
+        '''Switches straight to next_state when its assets are ready, otherwise waits on a loading screen'''
+        if AssetLoader.progress(keys) >= 1:
+            game.state = next_state(game)
+        else:
+            game.state = LoadingState(game, keys, next_state)
+
+    def update(self, events):
+        if AssetLoader.progress(self.keys) >= 1:
+            self.game.state = self.next_state(self.game)
+
+    def render(self, screen):
+        screen.fill((0, 0, 0))
+        loading_text = TextCache.render(press_font, "Loading...", True, (255, 255, 255))
+        screen.blit(loading_text, ((WIDTH - loading_text.get_width()) // 2, HEIGHT // 2 - loading_text.get_height() * 2))
+        bar = pygame.Rect(WIDTH // 4, HEIGHT // 2, WIDTH // 2, WIDTH // 40)
+        pygame.draw.rect(screen, (255, 255, 255), bar, 2)
+        bar.width = int(bar.width * AssetLoader.progress(self.keys))
+        pygame.draw.rect(screen, (255, 255, 255), bar)
         
 class GamePlayState(GameState):
+    PLAYER_SIZE = (WIDTH // 6, WIDTH // 6)
+    STAR_SIZE = (WIDTH * 0.08, WIDTH * 0.08)
+    STAR_PATHS = {
+        0: 'assets/graphics/star/star_empty.png',
+        0.5: 'assets/graphics/star/star_half.png',
+        1: 'assets/graphics/star/star_full.png',
+    }
+
+    @staticmethod
+    def prefetch_assets():
+        '''Queues everything a round needs on the loader pool; returns the loader keys to wait on'''
+        keys = [AssetBundle.prefetch('background')]
+        keys += SpriteCache.prefetch([Player.IMAGE_PATH], GamePlayState.PLAYER_SIZE)
+        keys += SpriteCache.prefetch(GamePlayState.STAR_PATHS.values(), GamePlayState.STAR_SIZE)
+        keys += SpriteCache.prefetch(Item.image_paths(), Item.SIZE)
+        keys += Sounds.prefetch()
+        return keys
+
     def __init__(self, game):
+        global SCORE, STAR
         super().__init__(game)
-        # Times
-        self.remaining_time = TIMER # 3 minutes
-        self.start_time = time.time()
-        self.countdown_time = COUNT_DOWN_TIMER  # Countdown timer for the last 10 seconds
+        # The rules, timers and score live in the simulated round; this state adds sprites, sound and input
+        self.round = Round(game_rules())
+        self.scale = WIDTH / self.round.rules.width # Simulation coordinates -> screen pixels
+        if self.round.rules.precise_collision:
+            self.round.collide = CollisionManager.precise_catch
+        SCORE, STAR = self.round.score, self.round.stars
+        if game.record_dir is not None:
+            os.makedirs(game.record_dir, exist_ok=True)
+            path = os.path.join(game.record_dir, time.strftime('round-%Y%m%d-%H%M%S.btcr'))
+            self.round.recorder = ReplayWriter(path, self.round)
         self.last_countdown_value = None
 
-        player_x = MID_X - (WIDTH // 10)  
-        player_y = GROUND_Y - (WIDTH // 16)  
-
-        # Player and Items
-        self.player = Player((player_x, player_y),  # position
-                             (WIDTH // 6, WIDTH // 6),  # scale_size
+        # Player and Items; sprites left over from the previous round go back to the pool
+        item_pool.release_all()
+        self.player = Player((self.round.player.x * self.scale, self.round.player.y * self.scale),  # position
+                             GamePlayState.PLAYER_SIZE,  # scale_size
                              (WIDTH // 16))  # speed
-        self.num_items_to_spawn = 1
-        self.spawn_timer = 0
-        self.spawn_interval = 30000  # Spawn interval in milliseconds
-        self.falling_items = [] #initializing list to keep track of falling items
-        self.slowdown_active = False  
-        self.boost_active = False
-        self.slowdown_duration = 5  
-        self.boost_duration = 5 
-        self.slowdown_timer = 0  
-        self.boost_timer = 0 
-        self.star_images = {
-            0: LoadAssets.load_img('assets/graphics/star/star_empty.png', (WIDTH * 0.08, WIDTH * 0.08)),
-            0.5: LoadAssets.load_img('assets/graphics/star/star_half.png', (WIDTH * 0.08, WIDTH * 0.08)),
-            1: LoadAssets.load_img('assets/graphics/star/star_full.png', (WIDTH * 0.08, WIDTH * 0.08))
-        }
-        
-        self.speed_threshold = 10
-        self.spawn_threshold = 30
+        self.item_sprites = {} # Simulated item -> its Item sprite
+        self.falling_items = [] # Item sprites, in the same order as self.round.items
+        self.star_images = {value: SpriteCache.get(path, GamePlayState.STAR_SIZE)
+                            for value, path in GamePlayState.STAR_PATHS.items()}
+
+        # Decode every item variant now rather than on the first spawn of each
+        SpriteCache.preload(Item.image_paths(), Item.SIZE)
+        # Start on the end screen in the background so the round ends without a stall
+        GameOverState.prefetch_assets()
+        self.board = None # Future of the leaderboard, read on the loader pool while the round is played
+        if game.scores is not None:
+            self.board = AssetLoader.pool().submit(game.scores.leaderboard, LEADERBOARD_SIZE)
+        self.renderer = DirtyRectRenderer(AssetBundle.load_screen('background'))
+        self.pause_layer = None # (overlay, [(text, position)]) for render_paused, built on first pause
+        self.pause_frames = 0 # Overlay blits since the game was paused
         
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
                 
-            # Get the keys pressed
-            keys = pygame.key.get_pressed()
-            # Update player position based on key events
-            self.player.update_position(keys)
+        # Movement is sampled once per tick in update(), however many events arrived
             
-    def update_position(self):
-    
-        '''Update item's position'''
-        if SCORE >= self.spawn_threshold and self.num_items_to_spawn < 4:
-            self.num_items_to_spawn += 1
-            self.spawn_threshold += 20
-                    
-        self.spawn_timer += 1000
-        if self.spawn_timer >= self.spawn_interval:
-            for _ in range(self.num_items_to_spawn):
-                new_item = Item.spawn_item()
-                self.falling_items.append(new_item)
-            self.spawn_timer = 0
-
-        for item in self.falling_items:
-            if not paused:
-                item.rect.y += int(item.speed)
-            if item.rect.y >= GROUND_Y:
-                self.falling_items.remove(item)  
-            elif CollisionManager.check_collision(self.player, item):
-                if item.type == ItemType.SLOWDOWN and self.player.speed > 40:
-                    self.player.speed -= 40
-                    self.activate_slowdown()
-                if item.type == ItemType.SPEEDUP:
-                    self.player.speed += 50
-                    self.activate_boost()
-                item.update_score_and_play_sound_effects()
-                self.falling_items.remove(item)    
-    
-
-    def activate_slowdown(self):
-        self.slowdown_active = True
-       # self.slowdown_timer = pygame.time.get_ticks()
-        self.slowdown_timer = time.time()
-
-    def activate_boost(self):
-        self.boost_active = True
-        #self.boost_timer = pygame.time.get_ticks()
-        self.boost_timer = time.time()
+    def update_position(self, sim_events):
+        '''Mirror the simulated items onto their sprites'''
+        for kind, sim_item in sim_events:
+            if kind == SPAWNED:
+                # Items start at the top of the screen
+                self.item_sprites[sim_item] = item_pool.acquire(
+                    sim_item.type, Item.image_path(sim_item.type, sim_item.variant), (sim_item.x * self.scale, 0), sim_item.speed)
+            elif kind == CAUGHT:
+                item = self.item_sprites.pop(sim_item)
+                item.play_sound_effect()
+                item_pool.release(item)
+            else:
+                item_pool.release(self.item_sprites.pop(sim_item))
 
+        self.falling_items = []
+        for sim_item in self.round.items:
+            item = self.item_sprites[sim_item]
+            item.remember_position()
+            item.rect.topleft = (sim_item.x * self.scale, sim_item.y * self.scale)
+            self.falling_items.append(item)
+        self.player.remember_position()
+        self.player.rect.x = self.round.player.x * self.scale
+        self.player.speed = self.round.player.speed
                      
     def update(self, events):
-        global ITEM_SPEED
-        self.update_position()
-        
-        # Calculate elapsed time since the start
-        elapsed_time = time.time() - self.start_time
-        # Decrement remaining time by elapsed time
-        self.remaining_time -= elapsed_time
-        # Update start time for the next iteration
-        self.start_time = time.time()
-        # Check if the remaining time is less than or equal to 0
-        if self.remaining_time <= 0:
-            pygame.mixer.music.stop()
-            # End the game if time runs out
-            self.game.state = GameOverState(self.game)
-            LoadAssets.play_sound(game_over_sound)
-        
-        if self.slowdown_active:
-            if self.start_time - self.slowdown_timer >= self.slowdown_duration:
-                self.player.speed = (WIDTH // 16)
-                self.slowdown_active = False
-        if self.boost_active:
-            if self.start_time - self.boost_timer >= self.boost_duration:
-                self.player.speed = (WIDTH // 16)
-                self.boost_active = False
-
-        # Speed up item over time logic
-        if SCORE >= self.speed_threshold:  # Check if the score exceeds the current threshold
-            ITEM_SPEED += 0.5
-            self.speed_threshold += 5
-            
-        # Losing Logic
-        if STAR <= 0:
-            pygame.mixer.music.stop()
-            self.game.state = GameOverState(self.game)
-            LoadAssets.play_sound(game_over_sound)
-        
-        # Winning Logic
-        if SCORE >= WINNING_SCORE and STAR > WINNING_STARS:
+        '''Advances the round by one fixed simulation tick of SIM_STEP seconds'''
+        global SCORE, STAR
+        self.round.section = Profiler.section if Profiler.enabled else None
+        move = Input.direction() if self.game.autoplay is None else self.game.autoplay(self.round)
+        sim_events = self.round.tick(move)
+        with Profiler.section('update_position'):
+            self.update_position(sim_events)
+        SCORE, STAR = self.round.score, self.round.stars
+
+        if self.round.outcome is not None:
+            self.close_recording()
             pygame.mixer.music.stop()
-            self.game.state = GameOverState(self.game)
-            LoadAssets.play_sound(game_win_sound)
+            self.game.state = GameOverState(self.game, self.round, self.board)
+            Sounds.play('game_win' if self.round.outcome == WIN else 'game_over')
             
-        # Countdown timer logic
-        if self.remaining_time <= self.countdown_time:
-            pygame.mixer.music.stop()
-            LoadAssets.play_sound(ten_sec_count_down_sound)
-            countdown_value = int(self.remaining_time) + 1  # Add 1 to ensure it goes from 10 to 0
-            if countdown_value != self.last_countdown_value:  # Only update if the value changes
-                self.last_countdown_value = countdown_value
+        # Countdown timer logic; the clip runs for the whole countdown, so it starts only once
+        if self.round.in_countdown():
+            if self.last_countdown_value is None:
+                pygame.mixer.music.stop()
+                Sounds.play('ten_sec_count_down')
+            self.last_countdown_value = self.round.countdown_value
             
-    def render_stars(self, screen):
+    def resize(self):
+        '''Rebuilds the player, star and item sprites at the sizes of the new resolution'''
+        self.scale = WIDTH / self.round.rules.width
+        self.player = Player((self.round.player.x * self.scale, self.round.player.y * self.scale),
+                             GamePlayState.PLAYER_SIZE, (WIDTH // 16))
+        self.star_images = {value: SpriteCache.get(path, GamePlayState.STAR_SIZE)
+                            for value, path in GamePlayState.STAR_PATHS.items()}
+        item_pool.release_all()
+        for sim_item in self.round.items:
+            item = item_pool.acquire(sim_item.type, Item.image_path(sim_item.type, sim_item.variant),
+                                     (sim_item.x * self.scale, sim_item.y * self.scale), sim_item.speed)
+            self.item_sprites[sim_item] = item
+        self.falling_items = [self.item_sprites[sim_item] for sim_item in self.round.items]
+        self.renderer = DirtyRectRenderer(AssetBundle.load_screen('background'))
+        self.pause_layer = None
+
+    def close_recording(self):
+        if self.round.recorder is not None:
+            self.round.recorder.close(self.round)
+
+    def render_stars(self, draws):
         x = WIDTH - (WIDTH // 11.428)  # Adjust this value for positioning
         y = WIDTH // 80                # Adjust this value for positioning
         star_count = int(STAR)
@@ -437,50 +1539,83 @@ class GamePlayState(GameState):
         
         for i in range(5):
             if i < star_count:
-                screen.blit(self.star_images[1], (x, y))
+                image = self.star_images[1]
             elif i == star_count and decimal_part >= 0.5:
-                screen.blit(self.star_images[0.5], (x, y))
+                image = self.star_images[0.5]
             else:
-                screen.blit(self.star_images[0], (x, y))
+                image = self.star_images[0]
+            draws.append((id(image), image, (x, y)))
             x -= self.star_images[1].get_width() 
-            
-    def render(self, screen):
-        global paused
-        
-        screen.blit(background_img, (0, 0))
-        
+
+    def draw_list(self):
+        '''Everything drawn over the background, in layer order, as (key, surface, position).
+           Keys identify the content, so an entry with the same key and position looks the same.'''
+        draws = []
+
         # Render stars
-        self.render_stars(screen)
+        self.render_stars(draws)
         
-        # Render the list of items
+        # Render the list of items, interpolated between the last two ticks
         for item in self.falling_items:
-            item.draw(screen, item.image)
+            draws.append((id(item.image), item.image, item.interpolated_position(self.game.alpha)))
         
         # Render player  
-        (self.player).draw(screen, (self.player).image)
+        draws.append((id(self.player.image), self.player.image, self.player.interpolated_position(self.game.alpha)))
         
         # Render score
-        score_text = regular_font.render("Score: " + str(SCORE), True, (170, 51, 106))
-        screen.blit(score_text, (10, 10))  # Adjust the position as needed
+        score_text = TextCache.render_number(regular_font, "Score: ", SCORE, True, (170, 51, 106))
+        draws.append((('score', SCORE), score_text, (WIDTH // 120, WIDTH // 120)))  # Adjust the position as needed
         
         # Render countdown timer
         if isinstance(self.last_countdown_value, int):
-            countdown_text = regular_big_font.render(str(self.last_countdown_value), True, (0, 0, 0))
+            countdown_text = TextCache.render_number(regular_big_font, "", self.last_countdown_value, True, (0, 0, 0))
             text_width, text_height = countdown_text.get_size()
             text_x = (WIDTH - text_width) // 2
             text_y = (HEIGHT - text_height) // 2
-            screen.blit(countdown_text, (text_x, text_y))       
+            draws.append((('countdown', self.last_countdown_value), countdown_text, (text_x, text_y)))
+        return draws
+            
+    def render(self, screen):
+        self.pause_frames = 0 # Playing again; the next pause fades out from the start
+        with Profiler.section('render.draw_list'):
+            draws = self.draw_list()
+        # The profiler overlay is drawn outside the draw list, so it needs full repaints
+        if self.game.dirty_rects_enabled and not Profiler.overlay:
+            with Profiler.section('render.dirty'):
+                self.game.dirty_rects = self.renderer.draw(screen, draws)
+            return
+
+        with Profiler.section('render.background'):
+            screen.blit(AssetBundle.load_screen('background'), (0, 0))
+        with Profiler.section('render.sprites'):
+            for _, surface, position in draws:
+                screen.blit(surface, position)
+        self.renderer.invalidate()
     
     def render_paused(self, screen):
+        self.renderer.invalidate() # The overlay covers the whole screen
+        if self.pause_layer is None:
+            self.pause_layer = self.compose_pause()
+        # Blitted every frame, the dark low-opacity overlay slowly fades the round out
+        overlay, texts = self.pause_layer
+        screen.blit(overlay, (0, 0))
+        for text, position in texts:
+            screen.blit(text, position)
+        self.pause_frames += 1
+
+    def paused_still(self):
+        return self.pause_frames >= PAUSE_FADE_FRAMES
+
+    def compose_pause(self):
+        '''The pause overlay and its centred text'''
         # Dark low-opacity overlay
-        overlay = pygame.Surface((WIDTH, HEIGHT))
+        overlay = pygame.Surface((WIDTH, HEIGHT)).convert()
         overlay.set_alpha(1)
         overlay.fill((1, 0, 1))
-        screen.blit(overlay, (0, 0))
         
         # Text: Press SPACE to continue. Press ESC or Q to quit.
-        pause_text1 = regular_font.render("Press SPACE to continue.", True, (255, 255, 255))
-        pause_text2 = regular_font.render("Press ESC or Q to quit.", True, (255, 255, 255))
+        pause_text1 = TextCache.render(regular_font, "Press SPACE to continue.", True, (255, 255, 255))
+        pause_text2 = TextCache.render(regular_font, "Press ESC or Q to quit.", True, (255, 255, 255))
         
         # Get the size of the text
         text_width1, text_height1 = pause_text1.get_size()
@@ -494,33 +1629,59 @@ class GamePlayState(GameState):
         text_y1 = (HEIGHT - text_height1) // 2 - text_height1  # Place the first text above the center
         text_y2 = (HEIGHT + text_height2) // 2             # Place the second text below the center
         
-        screen.blit(pause_text1, (text_x1, text_y1))
-        screen.blit(pause_text2, (text_x2, text_y2)) 
+        return overlay, [(pause_text1, (text_x1, text_y1)), (pause_text2, (text_x2, text_y2))]
     
 class GameOverState(GameState):
-    def __init__(self, game):
+    animated = False
+    STAR_PATH = 'assets/graphics/star/star_full.png'
+    STAR_BIG_SIZE = (WIDTH * 0.3, WIDTH * 0.3)
+    STAR_SMALL_SIZE = (WIDTH * 0.25, WIDTH * 0.25)
+
+    def __init__(self, game, round=None, board=None):
         super().__init__(game)
+        # The end screen never changes while it is open, so it is composed once and blitted every frame
+        self.layer = None
+        self.layer_key = None
+        # The finished round goes to the score history; the writer thread commits it
+        self.board = board
+        self.entry = None
+        # Only people's rounds go on the leaderboard, not those of the autoplay bot (attract mode)
+        if round is not None and game.scores is not None and game.autoplay is None:
+            self.entry = game.scores.add(round.score, round.stars, round.outcome, round.ticks, round.seed)
+
+    @staticmethod
+    def prefetch_assets():
+        '''Queues the end screens and their stars on the loader pool; returns the loader keys to wait on'''
+        keys = [AssetBundle.prefetch('game_win'), AssetBundle.prefetch('game_over')]
+        keys += SpriteCache.prefetch([GameOverState.STAR_PATH], GameOverState.STAR_BIG_SIZE)
+        keys += SpriteCache.prefetch([GameOverState.STAR_PATH], GameOverState.STAR_SMALL_SIZE)
+        return keys
+
+    def resize(self):
+        self.layer = None
         
     def handle_events(self, events):            
         for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN:
-                    self.game.state = GamePlayState(self.game)
-                    global SCORE, STAR, paused, TIMER, COUNT_DOWN_TIMER, ITEM_SPEED
-                    SCORE = 0
-                    STAR = 5
-                    paused = False
-                    TIMER = 60*2 # seconds
-                    COUNT_DOWN_TIMER = 10 # seconds
-                    ITEM_SPEED = WIDTH * (3 / 350)
+            elif Input.triggered(event, 'restart'):
+                self.restart()
+
+    def update(self, events):
+        if self.game.autoplay is not None:
+            self.restart() # The bot goes straight into the next round
+
+    def restart(self):
+        global paused
+        paused = False
+        # A fresh round resets SCORE and STAR along with everything else
+        self.game.state = GamePlayState(self.game)
                     
     def render_stars(self, screen, num_stars):
-        star_big = LoadAssets.load_img('assets/graphics/star/star_full.png', (int(WIDTH * 0.3), int(WIDTH * 0.3)))
-        star_small = LoadAssets.load_img('assets/graphics/star/star_full.png', (int(WIDTH * 0.25), int(WIDTH * 0.25)))
+        star_big = SpriteCache.get(GameOverState.STAR_PATH, GameOverState.STAR_BIG_SIZE)
+        star_small = SpriteCache.get(GameOverState.STAR_PATH, GameOverState.STAR_SMALL_SIZE)
         center_x = WIDTH // 2
-        y = HEIGHT // 2 - 300  # Adjust the vertical position as needed
+        y = HEIGHT // 2 - WIDTH // 4  # Adjust the vertical position as needed
         spacing = star_big.get_width() * 0.6  # Adjust the spacing between stars as needed
 
         # Render the center star first
@@ -536,94 +1697,405 @@ class GameOverState(GameState):
 
             
     def render(self, screen):
+        # Recompose only if the result shown has changed since the layer was drawn, or the leaderboard arrived
+        key = (SCORE, STAR, self.board_ready())
+        if self.layer is None or self.layer_key != key:
+            if self.layer is None:
+                self.layer = pygame.Surface((WIDTH, HEIGHT)).convert()
+            self.compose(self.layer)
+            self.layer_key = key
+        screen.blit(self.layer, (0, 0))
+
+    def view_key(self):
+        return self.board_ready() # The leaderboard may arrive after the screen was first shown
+
+    def board_ready(self):
+        return self.board is not None and self.board.done() and self.board.exception() is None
+
+    def render_leaderboard(self, screen, color, highlight):
+        '''Today's and all-time best rounds in the bottom corners, this round included and highlighted'''
+        today, best = self.board.result()
+        if self.entry is not None:
+            today, best = merge(today, self.entry, LEADERBOARD_SIZE), merge(best, self.entry, LEADERBOARD_SIZE)
+        line_height = press_font.get_linesize() * 1.4
+        y = HEIGHT * 0.6
+        for title, rows, x in (("TODAY", today, WIDTH // 16), ("ALL TIME", best, WIDTH - WIDTH // 4)):
+            screen.blit(TextCache.render(press_font, title, True, color), (x, y))
+            for place, row in enumerate(rows, 1):
+                text = TextCache.render_number(press_font, f"{place}. ", row['score'], True,
+                                               highlight if row is self.entry else color)
+                screen.blit(text, (x, y + place * line_height))
+
+    def compose(self, screen):
+        '''Draws the whole end screen for the current SCORE and STAR'''
         if SCORE >= WINNING_SCORE and STAR > WINNING_STARS:
-            screen.blit(game_win_screen, (0, 0))
-            win_text = game_win_font.render("YOU WIN!", True, (230, 62, 168))
+            screen.blit(AssetBundle.load_screen('game_win'), (0, 0))
+            win_text = TextCache.render(game_win_font, "YOU WIN!", True, (230, 62, 168))
 
             win_text_width, _ = game_win_font.size("YOU WIN!")
             win_text_x = (WIDTH - win_text_width) // 2
-            win_text_y = HEIGHT // 4 + 20 # Adjusted y position
+            win_text_y = HEIGHT // 4 + WIDTH // 60 # Adjusted y position
             screen.blit(win_text, (win_text_x, win_text_y))
 
             # Render stars
             self.render_stars(screen, int(STAR))
 
             # Render other text
-            score_text = regular_small_font.render(f"Score: {SCORE}", True, (252, 43, 113))
-            next_text = press_font.render("Press ENTER to Play Again", True, (169, 47, 32))
+            score_text = TextCache.render_number(regular_small_font, "Score: ", SCORE, True, (252, 43, 113))
+            next_text = TextCache.render(press_font, "Press ENTER to Play Again", True, (169, 47, 32))
 
             text_x = (WIDTH - score_text.get_width()) // 2
             text_y = HEIGHT // 2 - score_text.get_height()  # Adjusted y position
 
             # screen.blit(score_text, (text_x, text_y))
-            screen.blit(next_text, (text_x - score_text.get_height() - 200, text_y + score_text.get_height())) 
+            screen.blit(next_text, (text_x - score_text.get_height() - WIDTH // 6, text_y + score_text.get_height())) 
+            if self.board_ready():
+                self.render_leaderboard(screen, (169, 47, 32), (230, 62, 168))
             
         else:
-            screen.blit(game_over_screen, (0, 0))
-            over_text = game_over_font.render("GAME OVER", True, (251, 194, 7))
+            screen.blit(AssetBundle.load_screen('game_over'), (0, 0))
+            over_text = TextCache.render(game_over_font, "GAME OVER", True, (251, 194, 7))
 
             over_text_width, _ = game_over_font.size("GAME OVER")
             over_text_x = (WIDTH - over_text_width) // 2
             over_text_y = HEIGHT // 4 - (WIDTH / 8)
             screen.blit(over_text, (over_text_x, over_text_y))
 
-            play_again_text = regular_small_font.render("Press ENTER to Play Again", True, (255, 255, 255))
+            play_again_text = TextCache.render(regular_small_font, "Press ENTER to Play Again", True, (255, 255, 255))
             screen.blit(play_again_text, (WIDTH / 2 - (WIDTH / 4), HEIGHT / 4 + (WIDTH / 16)))
-            next_text = regular_small_font.render("Press 'L' to Accept the L :)", True, (255, 255, 255))
+            next_text = TextCache.render(regular_small_font, "Press 'L' to Accept the L :)", True, (255, 255, 255))
             screen.blit(next_text, (WIDTH / 2 - (WIDTH / 4), HEIGHT / 4 + (WIDTH / 8)))
+            if self.board_ready():
+                self.render_leaderboard(screen, (255, 255, 255), (251, 194, 7))
 
 class PauseState(GameState):
     def handle_events(self, events):
         for event in events:
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+            if Input.triggered(event, 'pause'):
                 self.game.toggle_pause()
                 
     def render(self, screen):
         pass
         
+# Render resolution
+def set_resolution(width):
+    '''Re-derives every render size from a new WIDTH. Fonts are recreated and cached surfaces
+       dropped; screens and sprites are loaded again at the new size on next use (from the
+       prescaled bundle for that size once it exists). The simulation is not affected.'''
+    global WIDTH, HEIGHT, MID_X, MID_Y, GROUND_Y
+    WIDTH = width
+    HEIGHT = WIDTH * 0.75
+    MID_X = WIDTH / 2
+    MID_Y = WIDTH / 2
+    GROUND_Y = HEIGHT - (WIDTH // 10) - (WIDTH * (83/800))
+    # The same expressions as in the class definitions
+    Item.SIZE = (WIDTH // 12, WIDTH // 12)
+    GamePlayState.PLAYER_SIZE = (WIDTH // 6, WIDTH // 6)
+    GamePlayState.STAR_SIZE = (WIDTH * 0.08, WIDTH * 0.08)
+    GameOverState.STAR_BIG_SIZE = (WIDTH * 0.3, WIDTH * 0.3)
+    GameOverState.STAR_SMALL_SIZE = (WIDTH * 0.25, WIDTH * 0.25)
+    load_fonts()
+    SpriteCache.clear()
+    TextCache.clear()
+    AssetBundle.screens.clear()
+    # Sprite and screen loads are all sized for the old WIDTH; sounds do not depend on it
+    for key in [key for key in AssetLoader.futures if key[0] in ('sprite', 'screen')]:
+        AssetLoader.release(key)
+    Profiler.overlay_surface = None
+
 # Game class
 class Game:
     def __init__(self):
         self.running = True
-        self.state = MainMenuState(self)
+        self.state = None
+        self.time_to_first_frame = None # Seconds from launch until the first flip
+        self.dirty_rects_enabled = DIRTY_RECTS
+        self.dirty_rects = None # Set by a state that only repainted part of the screen this frame
+        self.pixels_pushed = 0 # Pixels sent to the display in the last frame
+        self.total_pixels_pushed = 0
+        self.frames = 0
+        self.ticks = 0 # Simulation ticks run so far
+        self.accumulator = 0.0 # Frame time not yet consumed by a tick
+        self.alpha = 1.0 # How far rendering is between the last two ticks
+        self.record_dir = None # Directory to write a replay of every round to
+        self.screen = None # What states draw on: the window, or a WIDTH x HEIGHT framebuffer scaled to it
+        self.smooth_scaling = SMOOTH_SCALING
+        self.auto_resolution = AUTO_RESOLUTION
+        self.frame_budget = 1 / FRAME_RATE # Seconds of work a frame may take before auto resolution steps down
+        self.frame_work = deque(maxlen=RESOLUTION_WINDOW) # Seconds of work in recent frames, without the wait
+        self.resolution_changes = 0
+        self.low_power = LOW_POWER
+        self.shown = None # view() of the last frame presented, None when the window needs repainting
+        self.idle_wakeups = 0 # Loop iterations that presented nothing because the screen was already up to date
+        self.autoplay = None # A simulation policy, e.g. POLICIES['catcher'], that plays instead of the keyboard
+        self.capture_dir = None # Start capturing into this directory as soon as the window opens
+        self.scores_path = SCORES_PATH
+        self.scores = None # ScoreStore while running, if scores_path is set
         
     def toggle_pause(self):
         global paused
         paused = not paused
+
+    def present(self):
+        '''Pushes the frame to the display, only the dirty rects if the state provided them'''
+        with Profiler.section('display'):
+            self.push_frame()
+        Input.presented()
+        self.total_pixels_pushed += self.pixels_pushed
+        self.frames += 1
+
+    def view(self):
+        '''What decides the picture of a state that is not animated'''
+        return (self.state, paused, WIDTH, self.state.view_key())
+
+    def idle(self):
+        '''Low power: True when the frame last presented is still exactly what would be drawn now'''
+        if not self.low_power or Profiler.overlay or self.autoplay is not None or Capture.active:
+            return False
+        still = self.state.paused_still() if paused else not self.state.animated
+        return still and self.shown == self.view()
+
+    def push_frame(self):
+        window = pygame.display.get_surface()
+        dirty_rects = self.dirty_rects
+        if self.screen is not None and self.screen is not window:
+            dirty_rects = self.scale_to_window(window, dirty_rects)
+        if dirty_rects is not None:
+            pygame.display.update(dirty_rects)
+            self.pixels_pushed = DirtyRectRenderer.covered_area(dirty_rects, window.get_rect())
+        else:
+            pygame.display.flip()
+            self.pixels_pushed = window.get_width() * window.get_height()
+
+    def framebuffer(self):
+        '''The window if it is WIDTH x HEIGHT, otherwise an offscreen surface of that size'''
+        window = pygame.display.get_surface()
+        if window.get_size() == AssetBundle.size():
+            return window
+        return pygame.Surface(AssetBundle.size()).convert()
+
+    def scale_to_window(self, window, dirty_rects):
+        '''Scales the framebuffer onto the window in one pass; returns the dirty rects in window pixels'''
+        if self.smooth_scaling:
+            pygame.transform.smoothscale(self.screen, window.get_size(), window)
+        else:
+            pygame.transform.scale(self.screen, window.get_size(), window)
+        if dirty_rects is None:
+            return None
+        fx = window.get_width() / self.screen.get_width()
+        fy = window.get_height() / self.screen.get_height()
+        # One pixel of margin covers rounding and the smooth filter reaching into neighbours
+        return [pygame.Rect(int(rect.x * fx) - 1, int(rect.y * fy) - 1, int(rect.w * fx) + 3, int(rect.h * fy) + 3)
+                for rect in dirty_rects]
+
+    def change_resolution(self, width):
+        '''Switches the render width mid-game; the current state rebuilds its sprites at the new size'''
+        set_resolution(width)
+        self.screen = self.framebuffer()
+        if self.state is not None:
+            self.state.resize()
+        self.frame_work.clear()
+        self.resolution_changes += 1
+
+    def adapt_resolution(self, work):
+        '''Auto resolution: over the last RESOLUTION_WINDOW frames, steps down through RESOLUTIONS
+           when the mean work per frame is over budget, and back up when the larger frame should fit'''
+        self.frame_work.append(work)
+        if len(self.frame_work) < RESOLUTION_WINDOW:
+            return
+        mean = sum(self.frame_work) / len(self.frame_work)
+        lower = [width for width in RESOLUTIONS if width < WIDTH]
+        higher = [width for width in RESOLUTIONS if width > WIDTH]
+        if mean > self.frame_budget and lower:
+            self.change_resolution(max(lower))
+        # Fill cost grows with the pixel count, and stepping up leaves a quarter of the budget spare
+        elif higher and mean * (min(higher) / WIDTH) ** 2 < self.frame_budget * 0.75:
+            self.change_resolution(min(higher))
             
-    def run(self):
+    def step(self, events, frame_time):
+        '''Runs as many fixed ticks as frame_time covers; the remainder carries over to the next frame'''
+        self.accumulator += min(frame_time, MAX_FRAME_TIME)
+        while self.accumulator >= SIM_STEP:
+            self.state.update(events)
+            self.accumulator -= SIM_STEP
+            self.ticks += 1
+        self.alpha = self.accumulator / SIM_STEP
+
+    def run(self, max_frames=None, frame_rate=None, trace_path=None):
+        '''Main loop. With trace_path, profiling is on from the first frame and the trace is saved on exit.
+           A static screen is drawn once, then the loop sleeps in Input.poll until an event arrives;
+           those wakeups count towards max_frames along with the frames presented.'''
         global paused
-        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        frame_rate = FRAME_RATE if frame_rate is None else frame_rate
+        self.frame_budget = 1 / (frame_rate or FRAME_RATE)
+        pygame.display.set_mode(WINDOW_SIZE)
         pygame.display.set_caption(TITLE)
+        self.screen = self.framebuffer()
+        Input.install()
+
+        # Only the welcome screen blocks; gameplay assets load in the background meanwhile
+        AssetBundle.prefetch('welcome')
+        if self.state is None and self.autoplay is not None:
+            self.state = LoadingState(self, GamePlayState.prefetch_assets(), GamePlayState)
+        elif self.state is None:
+            self.state = MainMenuState(self)
+        GamePlayState.prefetch_assets()
+        Sounds.start_music()
         
+        if trace_path is not None:
+            if not Profiler.enabled:
+                Profiler.toggle()
+            Profiler.start_trace()
+        if self.scores_path is not None and self.scores is None:
+            try:
+                self.scores = ScoreStore(self.scores_path)
+            except (sqlite3.Error, OSError) as error:
+                # A read-only install or working directory still plays, it just keeps no score history
+                print(f"Score history disabled, cannot open {self.scores_path}: {error}")
+        if self.capture_dir is not None:
+            Capture.start(self.screen, frame_rate, self.capture_dir, Capture.command)
+
         clock = pygame.time.Clock()
+        self.accumulator = 0.0
+        last_frame = time.perf_counter()
         while self.running:
-            events = pygame.event.get()
+            now = time.perf_counter()
+            frame_time, last_frame = now - last_frame, now
+            sleeping = self.idle()
+            with Profiler.section('events'):
+                events = Input.poll(IDLE_TIMEOUT if sleeping else None)
+            if sleeping:
+                # Time spent asleep is not game time
+                now = last_frame = time.perf_counter()
+                frame_time = 0.0
             for event in events:
+                if event.type in REDRAW_EVENTS:
+                    self.shown = None
                 if event.type == pygame.QUIT:
                     self.running = False
                     break
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE or event.key == pygame.K_q or event.key == pygame.K_l:
-                        self.running = False
-                        break
-                    if event.key == pygame.K_SPACE:
-                        self.toggle_pause()  # Toggle pause when 'SPACE' key is pressed
+                if Input.triggered(event, 'quit'):
+                    self.running = False
+                    break
+                if Input.triggered(event, 'pause'):
+                    self.toggle_pause()  # Toggle pause when 'SPACE' key is pressed
+                if Input.triggered(event, 'dirty_rects'):
+                    self.dirty_rects_enabled = not self.dirty_rects_enabled
+                if Input.triggered(event, 'profiler'):
+                    Profiler.toggle()
+                if Input.triggered(event, 'trace'):
+                    if Profiler.trace_events is None:
+                        Profiler.start_trace()
+                    else:
+                        Profiler.save_trace(time.strftime('trace-%Y%m%d-%H%M%S.json'))
+                if Input.triggered(event, 'capture'):
+                    Capture.toggle(self.screen, frame_rate)
             
+            self.dirty_rects = None
+
+            if not paused:
+                with Profiler.section('handle_events'):
+                    self.state.handle_events(events)
+            if self.idle():
+                # Nothing to draw that is not already on screen
+                self.idle_wakeups += 1
+                if max_frames is not None and self.frames + self.idle_wakeups >= max_frames:
+                    break
+                continue
+
             if not paused:  # Only update and render the game when not paused
-                self.state.handle_events(events)
-                self.state.update(events)
-                self.state.render(screen)
+                with Profiler.section('update'):
+                    self.step(events, frame_time)
+                with Profiler.section('render'):
+                    self.state.render(self.screen)
                        # Render pause screen
             if paused:
-                self.state.render_paused(screen)
+                self.accumulator = 0.0 # Do not catch up on time spent paused
+                self.state.render_paused(self.screen)
+            if Profiler.overlay:
+                Profiler.render_overlay(self.screen)
+            if Capture.active:
+                with Profiler.section('capture'):
+                    Capture.frame(self.screen)
             
-            pygame.display.flip()
-            clock.tick(30)
+            self.present()
+            self.shown = self.view()
+            if Profiler.enabled:
+                Profiler.add('frame', now, time.perf_counter())
+                Profiler.end_frame()
+            if self.time_to_first_frame is None:
+                self.time_to_first_frame = time.perf_counter() - LAUNCH_TIME
+                print(f"Time to first frame: {self.time_to_first_frame * 1000:.1f} ms")
+            if self.auto_resolution and not paused:
+                self.adapt_resolution(time.perf_counter() - now)
+            clock.tick(frame_rate)
+
+            if max_frames is not None and self.frames + self.idle_wakeups >= max_frames:
+                break
             
+        if isinstance(self.state, GamePlayState):
+            self.state.close_recording() # Keep the inputs of a round that was quit midway
+        if Profiler.trace_events is not None:
+            Profiler.save_trace(trace_path or time.strftime('trace-%Y%m%d-%H%M%S.json'))
+        Capture.stop()
+        AssetLoader.shutdown()
+        if self.scores is not None:
+            self.scores.close() # Commits the rounds still queued
         pygame.quit()
         
+def parse_resolution(text):
+    '''"600" or "600x450" -> 600; the height always follows from the 4:3 aspect ratio'''
+    width, _, height = text.lower().partition('x')
+    width = int(width)
+    if height and int(height) != int(width * 0.75):
+        raise ValueError(f'{text} is not 4:3')
+    return width
+
 # Main
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument('--fps', type=int, default=FRAME_RATE,
+                        help=f'render frame cap, e.g. 60, 120 or 144; 0 for uncapped (default {FRAME_RATE})')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='profile every frame and write a Chrome trace JSON to FILE on exit')
+    parser.add_argument('--record', metavar='DIR',
+                        help='write a replay of every round to DIR (play back with python3 replay.py)')
+    parser.add_argument('--resolution', type=parse_resolution, metavar='WIDTH[xHEIGHT]',
+                        help=f'internal render size, e.g. 600x450, scaled to the {WINDOW_SIZE[0]}x{WINDOW_SIZE[1]} window')
+    parser.add_argument('--smooth', action='store_true',
+                        help='scale the internal frame with a smooth filter instead of nearest neighbour')
+    parser.add_argument('--bindings', metavar='FILE',
+                        help='JSON of action -> key names, e.g. {"left": ["a", "left"], "right": ["d", "right"]}')
+    parser.add_argument('--auto-resolution', action='store_true',
+                        help=f'lower or raise the internal render width among {RESOLUTIONS} to stay within the frame budget')
+    parser.add_argument('--autoplay', choices=sorted(POLICIES), metavar='POLICY',
+                        help=f'let a bot play round after round, one of {sorted(POLICIES)}')
+    parser.add_argument('--capture', nargs='?', const=CAPTURE_DIR, metavar='DIR',
+                        help=f'capture every frame from launch to a PNG sequence under DIR (default {CAPTURE_DIR}); F5 toggles')
+    parser.add_argument('--capture-command', nargs='?', const=CAPTURE_COMMAND, metavar='CMD',
+                        help='pipe captured frames (from --capture or F5) as raw RGB to an encoder instead of writing PNGs'
+                             ' (default: ffmpeg to an .mp4); {width}, {height}, {fps} and {output} are filled in')
+    parser.add_argument('--scores', default=SCORES_PATH, metavar='FILE',
+                        help=f'SQLite score history shown on the end screen (default {SCORES_PATH})')
+    parser.add_argument('--no-scores', action='store_true', help='keep no score history')
+    parser.add_argument('--no-low-power', action='store_true',
+                        help='redraw static screens every frame instead of sleeping until input')
+    args = parser.parse_args()
+
+    if args.resolution is not None:
+        set_resolution(args.resolution)
+    if args.bindings is not None:
+        Input.load_bindings(args.bindings)
+
     game = Game()
-    game.run()
\ No newline at end of file
+    game.record_dir = args.record
+    game.smooth_scaling = game.smooth_scaling or args.smooth
+    game.auto_resolution = game.auto_resolution or args.auto_resolution
+    game.low_power = game.low_power and not args.no_low_power
+    if args.autoplay is not None:
+        game.autoplay = POLICIES[args.autoplay]
+    Capture.command = args.capture_command
+    game.capture_dir = args.capture
+    game.scores_path = None if args.no_scores else args.scores
+    game.run(frame_rate=args.fps, trace_path=args.trace)
\ No newline at end of file
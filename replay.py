@@ -0,0 +1,138 @@
+# replay.py
+# Deterministic record and replay of rounds. A round depends only on its rules, its seed and the
+# sequence of player moves and ticks, so logging those is enough to play it again exactly.
+#
+# File format (little-endian), written append-only while the round runs:
+#   header  b'BTCR', version u8, seed u64, rules JSON length u32, rules JSON (Rules.to_dict)
+#   records one byte each:
+#             0x01          player moved left
+#             0x02          player moved right
+#             0x80 | n      n ticks (1..127) with no input in between
+#             0x03 + '<BIhI' end of round: outcome, score, stars * 2, ticks (for verification)
+# Bump VERSION whenever Rules gains a parameter, and list in MIGRATIONS what older files played with.
+# Usage: python replay.py round.btcr [more.btcr ...]
+
+import json
+import struct
+from simulation import Round, Rules, WIN, LOSE, TIMEOUT
+
+MAGIC = b'BTCR'
+VERSION = 2
+# Rules parameters added after each older version, with the values that version's rounds were played with
+MIGRATIONS = {
+    1: {'precise_collision': False, 'spawn_pattern': 'burst'},
+}
+LEFT = 0x01
+RIGHT = 0x02
+END = 0x03
+TICKS = 0x80
+MAX_RUN = 0x7F
+OUTCOMES = [None, WIN, LOSE, TIMEOUT]
+END_FORMAT = '<BIhI'
+
+class ReplayWriter:
+    '''Streams one round's inputs to a file. Attach with round.recorder = ReplayWriter(path, round).'''
+    def __init__(self, path, round):
+        self.path = path
+        self.file = open(path, 'wb')
+        rules = json.dumps(round.rules.to_dict(), separators=(',', ':')).encode()
+        self.file.write(MAGIC + struct.pack('<BQI', VERSION, round.seed, len(rules)) + rules)
+        self.pending_ticks = 0
+
+    def move(self, direction):
+        self.flush_ticks()
+        self.file.write(bytes([LEFT if direction < 0 else RIGHT]))
+
+    def tick(self):
+        self.pending_ticks += 1
+        if self.pending_ticks == MAX_RUN:
+            self.flush_ticks()
+
+    def flush_ticks(self):
+        '''Writes the run of ticks seen since the last input and pushes it to disk'''
+        if self.pending_ticks:
+            self.file.write(bytes([TICKS | self.pending_ticks]))
+            self.pending_ticks = 0
+            self.file.flush()
+
+    def close(self, round=None):
+        '''Finishes the file; with the finished round, also writes its result for verification'''
+        if self.file.closed:
+            return
+        self.flush_ticks()
+        if round is not None and round.outcome is not None:
+            self.file.write(bytes([END]) + struct.pack(END_FORMAT, OUTCOMES.index(round.outcome),
+                                                       round.score, int(round.stars * 2), round.ticks))
+        self.file.close()
+
+class Replay:
+    '''A recorded round loaded from disk'''
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f'{path} is not a Build The Cake replay')
+        version, self.seed, rules_length = struct.unpack_from('<BQI', data, 4)
+        if version != VERSION and version not in MIGRATIONS:
+            raise ValueError(f'{path} has replay version {version}, expected {VERSION}')
+        start = 4 + struct.calcsize('<BQI')
+        params = json.loads(data[start:start + rules_length])
+        added = {}
+        for old_version in range(version, VERSION):
+            added.update(MIGRATIONS[old_version])
+        expected = set(Rules.PARAMETERS) - set(added)
+        if set(params) != expected:
+            # Defaults would quietly stand in for anything missing, and the round would not play back the same
+            raise ValueError(f'{path} has replay version {version} but its rules do not match it:'
+                             f' missing {sorted(expected - set(params))}, unexpected {sorted(set(params) - expected)}')
+        self.rules = Rules.from_dict(dict(params, **added))
+        self.records = data[start + rules_length:]
+        self.expected = None # (outcome, score, stars, ticks) if the round finished while recording
+
+    def play(self, round_class=Round):
+        '''Replays the round as fast as possible and returns it'''
+        round = round_class(self.rules, self.seed)
+        if self.rules.precise_collision:
+            from main import CollisionManager # Needs the sprite masks, so only precise rounds load pygame
+            round.collide = CollisionManager.precise_catch
+        records = self.records
+        i = 0
+        while i < len(records):
+            code = records[i]
+            i += 1
+            if code & TICKS:
+                for _ in range(code & MAX_RUN):
+                    round.tick()
+            elif code == LEFT:
+                round.move_player(-1)
+            elif code == RIGHT:
+                round.move_player(1)
+            elif code == END:
+                outcome, score, stars, ticks = struct.unpack_from(END_FORMAT, records, i)
+                self.expected = (OUTCOMES[outcome], score, stars / 2, ticks)
+                break
+        return round
+
+    def verify(self, round):
+        '''True if a replayed round ended exactly as the recording did (or nothing was recorded to compare)'''
+        return self.expected is None or self.expected == (round.outcome, round.score, round.stars, round.ticks)
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Replay recorded rounds headlessly and check their results')
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.paths:
+        replay = Replay(path)
+        start = time.perf_counter()
+        round = replay.play()
+        elapsed = time.perf_counter() - start
+        status = 'ok' if replay.verify(round) else f'MISMATCH, recorded {replay.expected}'
+        failed |= not replay.verify(round)
+        speedup = round.ticks / replay.rules.tick_rate / elapsed if elapsed else float('inf')
+        print(f'{path}: {round.outcome} score {round.score} stars {round.stars} ticks {round.ticks}'
+              f' in {elapsed * 1000:.1f} ms ({speedup:,.0f}x real time) {status}')
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,206 @@
+# scores.py
+# Persistent score history in SQLite. The game only queues results; a writer thread commits them in
+# batches on its own connection, so the render loop never waits on disk. The database runs in WAL
+# mode, so leaderboard reads on another connection go on while a batch is being written. Rounds still
+# waiting for their commit are merged into top-K reads, so a board read right after add() includes them.
+# Indexes on (score) and (day, score) let top-K queries, all-time or for one day, read just K rows.
+# Usage: python scores.py scores.db [--top 10] [--day 2024-05-01]
+
+import datetime
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,  -- Unix time the round ended
+    day TEXT NOT NULL,        -- Local date of played_at, YYYY-MM-DD
+    score INTEGER NOT NULL,
+    stars REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    ticks INTEGER NOT NULL,
+    seed INTEGER
+);
+CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC, stars DESC, played_at);
+CREATE INDEX IF NOT EXISTS scores_by_day ON scores (day, score DESC, stars DESC, played_at);
+'''
+COLUMNS = ('played_at', 'day', 'score', 'stars', 'outcome', 'ticks', 'seed')
+INSERT = f'INSERT INTO scores ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})'
+RANKED = 'SELECT played_at, day, score, stars, outcome, ticks, seed FROM scores'
+ORDER = 'ORDER BY score DESC, stars DESC, played_at'
+BATCH_SIZE = 500 # Most rows committed in one transaction
+FLUSH_INTERVAL = 0.5 # Seconds a queued row may wait for more to share its commit
+
+def day_of(played_at):
+    return datetime.date.fromtimestamp(played_at).isoformat()
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL') # In WAL mode only a power cut can lose the last commits
+    return connection
+
+class ScoreStore:
+    '''Score history of every round. add() never blocks; top() and friends read committed rows.'''
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reader = connect(path)
+        try:
+            self.reader.executescript(SCHEMA)
+        except sqlite3.Error:
+            self.reader.close()
+            raise
+        self.read_lock = threading.Lock() # Reads may come from loader threads; one at a time on this connection
+        self.queue = queue.Queue() # (row tuple, pending key or None), then None to stop the writer
+        self.pending = {} # Rows queued by add() and not committed yet, by key
+        self.pending_lock = threading.Lock()
+        self.added = 0
+        self.batches = 0
+        self.written = 0
+        self.failed = None # Error that stopped the writer, if any
+        self.writer = threading.Thread(target=self.write_loop, name='scores', daemon=True)
+        self.writer.start()
+
+    def add(self, score, stars, outcome, ticks, seed=None, played_at=None):
+        '''Queues a finished round and returns its row as a dict, as the queries return them'''
+        played_at = time.time() if played_at is None else played_at
+        row = {'played_at': played_at, 'day': day_of(played_at), 'score': score, 'stars': stars,
+               'outcome': outcome, 'ticks': ticks, 'seed': seed}
+        with self.pending_lock:
+            self.added += 1
+            key = self.added
+            self.pending[key] = row
+        self.queue.put((tuple(row[column] for column in COLUMNS), key))
+        return row
+
+    def add_many(self, rows):
+        '''Queues tuples in COLUMNS order, e.g. for imports and benchmarks'''
+        for row in rows:
+            self.queue.put((row, None))
+
+    def write_loop(self):
+        '''Writer thread: commits whatever has been queued, in batches, until close()'''
+        try:
+            connection = connect(self.path)
+        except sqlite3.Error as error:
+            # Rows are dropped, but still marked done so flush() and close() do not wait forever
+            self.failed = error
+            for _, key in iter(self.queue.get, None):
+                with self.pending_lock:
+                    self.pending.pop(key, None)
+                self.queue.task_done()
+            self.queue.task_done()
+            return
+        running = True
+        while running:
+            first = self.queue.get()
+            if first is None:
+                self.queue.task_done()
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    self.queue.task_done()
+                    running = False
+                    break
+                batch.append(row)
+            try:
+                with connection:
+                    connection.executemany(INSERT, [row for row, _ in batch])
+                self.batches += 1
+                self.written += len(batch)
+            except sqlite3.Error as error:
+                self.failed = self.failed or error
+            with self.pending_lock:
+                for _, key in batch:
+                    self.pending.pop(key, None)
+            for _ in batch:
+                self.queue.task_done()
+        connection.close()
+
+    def flush(self):
+        '''Blocks until every queued row is committed'''
+        self.queue.join()
+
+    def close(self):
+        '''Commits what is queued and stops the writer'''
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        with self.read_lock:
+            self.reader.close()
+
+    def query(self, sql, *args):
+        with self.read_lock:
+            cursor = self.reader.execute(sql, args)
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def top(self, k=10, day=None):
+        '''The k best rounds, all-time or of one day ('YYYY-MM-DD'); ties go to the most stars, then the earliest.
+           Includes rounds added but not committed yet.'''
+        if day is None:
+            board = self.query(f'{RANKED} {ORDER} LIMIT ?', k)
+        else:
+            board = self.query(f'{RANKED} WHERE day = ? {ORDER} LIMIT ?', day, k)
+        with self.pending_lock:
+            pending = [row for row in self.pending.values() if day is None or row['day'] == day]
+        # A row may be committed between the query and the snapshot; it is then already on the board
+        shown = {(row['played_at'], row['score']) for row in board}
+        for row in pending:
+            if (row['played_at'], row['score']) not in shown:
+                board = merge(board, row, k)
+        return board
+
+    def rank(self, score, day=None):
+        '''Place a score would take on the all-time or daily board, 1 for the best, among committed rounds'''
+        if day is None:
+            rows = self.query('SELECT COUNT(*) AS better FROM scores WHERE score > ?', score)
+        else:
+            rows = self.query('SELECT COUNT(*) AS better FROM scores WHERE day = ? AND score > ?', day, score)
+        return rows[0]['better'] + 1
+
+    def daily(self, days=7, today=None):
+        '''Rounds played, best and mean score for each of the last days, newest first'''
+        today = datetime.date.fromisoformat(today) if today else datetime.date.today()
+        first = (today - datetime.timedelta(days=days - 1)).isoformat()
+        return self.query('SELECT day, COUNT(*) AS rounds, MAX(score) AS best, AVG(score) AS mean '
+                          'FROM scores WHERE day >= ? GROUP BY day ORDER BY day DESC', first)
+
+    def leaderboard(self, k=5, day=None):
+        '''(best of the day, best of all time) for the end screen'''
+        return self.top(k, day or datetime.date.today().isoformat()), self.top(k)
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'pending': len(self.pending), 'batches': self.batches, 'written': self.written,
+                'failed': None if self.failed is None else str(self.failed)}
+
+def merge(board, row, k):
+    '''A top-k board read earlier with a round that has not been committed yet, in the same order as top()'''
+    ranked = sorted(board + [row], key=lambda entry: (-entry['score'], -entry['stars'], entry['played_at']))
+    return ranked[:k]
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Print the leaderboard and daily summary of a score database')
+    parser.add_argument('path')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--day', help='YYYY-MM-DD; the all-time board when left out')
+    args = parser.parse_args()
+
+    store = ScoreStore(args.path)
+    for place, row in enumerate(store.top(args.top, args.day), 1):
+        print(f"{place:>3}. {row['score']:>5}  {row['stars']:>3} stars  {row['outcome']:<8} "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(row['played_at']))}")
+    for row in store.daily():
+        print(f"{row['day']}: {row['rounds']} rounds, best {row['best']}, mean {row['mean']:.1f}")
+    store.close()
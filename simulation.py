@@ -0,0 +1,503 @@
+# simulation.py
+# Pure game rules for Build The Cake: no pygame, no sound, no images.
+# A Round can be ticked thousands of times per second, so balance and regression checks
+# run on machines without a display. main.GamePlayState drives the same Round interactively.
+
+import heapq
+import math
+import random
+from enum import Enum
+
+class ItemType(Enum):
+    GOOD = 4
+    BAD = 6
+    BONUS = 2
+    SLOWDOWN = 1
+    SPEEDUP = 3
+
+# Number of image variants available under assets/graphics/{TYPE}/
+ITEM_VARIANTS = {
+    ItemType.GOOD: 4,
+    ItemType.BAD: 6,
+    ItemType.BONUS: 2,
+    ItemType.SLOWDOWN: 1,
+    ItemType.SPEEDUP: 1,
+}
+
+# Relative chance of each type being picked for a spawn
+ITEM_WEIGHTS = {
+    ItemType.GOOD: 4,
+    ItemType.BAD: 4,
+    ItemType.BONUS: 1,
+    ItemType.SLOWDOWN: 1,
+    ItemType.SPEEDUP: 1,
+}
+
+# How the items of each wave are released. Every spawn_interval ticks a wave of num_items_to_spawn
+# items starts; a pattern may space them out and place them:
+#   stagger  ticks between the items of one wave (0 drops the whole wave at once)
+#   lanes    number of fixed columns items drop in (0 for anywhere across the field)
+#   sweep    with lanes, walk the lanes left to right instead of picking one at random
+#   ramps    [(seconds, 'items_per_wave' | 'item_speed', step), ...] timed difficulty steps
+SPAWN_PATTERNS = {
+    'burst': {},
+    'staggered': {'stagger': 6},
+    'lanes': {'lanes': 6},
+    'sweep': {'lanes': 6, 'stagger': 4, 'sweep': True},
+    'rising': {'ramps': [(30, 'items_per_wave', 1), (60, 'items_per_wave', 1), (90, 'item_speed', 2)]},
+}
+PATTERN_DEFAULTS = {'stagger': 0, 'lanes': 0, 'sweep': False, 'ramps': []}
+
+class Rules:
+    '''Every tunable of a round. Sizes and speeds default to the values main.py derives from width.
+       Speeds are in pixels per tick and intervals in ticks, at tick_rate ticks per second.'''
+    def __init__(self, width=1200, tick_rate=30, round_time=60*2, countdown_time=10,
+                 item_speed=None, item_weights=None, winning_score=50, winning_stars=3,
+                 starting_stars=5, spawn_interval=30, spawn_threshold=30, spawn_threshold_step=20,
+                 items_per_wave=1, max_items_per_wave=4, speed_threshold=10, speed_threshold_step=5, speed_step=0.5,
+                 slowdown_duration=5, boost_duration=5, precise_collision=False, spawn_pattern='burst'):
+        self.width = width
+        self.height = width * 0.75
+        self.ground_y = self.height - (width // 10) - (width * (83/800))
+        self.item_size = width // 12
+        self.player_size = width // 6
+        self.player_speed = width // 16
+        self.player_x = width / 2 - (width // 10)
+        self.player_y = self.ground_y - (width // 16)
+        self.tick_rate = tick_rate
+        self.round_time = round_time # seconds
+        self.countdown_time = countdown_time # seconds
+        self.item_speed = width * (3 / 350) if item_speed is None else item_speed
+        self.bad_item_slowdown = 0.3 # BAD items fall this much slower
+        self.item_weights = dict(ITEM_WEIGHTS if item_weights is None else item_weights)
+        self.winning_score = winning_score
+        self.winning_stars = winning_stars
+        self.starting_stars = starting_stars
+        self.spawn_interval = spawn_interval
+        self.spawn_threshold = spawn_threshold
+        self.spawn_threshold_step = spawn_threshold_step
+        self.items_per_wave = items_per_wave # Wave size at the start of a round
+        self.max_items_per_wave = max_items_per_wave
+        self.speed_threshold = speed_threshold
+        self.speed_threshold_step = speed_threshold_step
+        self.speed_step = speed_step
+        self.slowdown_penalty = 40 # Player speed lost to a snail
+        self.boost_bonus = 50 # Player speed gained from a soda
+        self.slowdown_duration = slowdown_duration # seconds
+        self.boost_duration = boost_duration # seconds
+        self.precise_collision = precise_collision # Catches also need Round.collide to confirm them
+        self.spawn_pattern = spawn_pattern # Name in SPAWN_PATTERNS, or a pattern dict of its own
+
+    # Constructor arguments, in order; every one is kept as an attribute of the same name
+    PARAMETERS = ('width', 'tick_rate', 'round_time', 'countdown_time', 'item_speed', 'item_weights',
+                  'winning_score', 'winning_stars', 'starting_stars', 'spawn_interval', 'spawn_threshold',
+                  'spawn_threshold_step', 'items_per_wave', 'max_items_per_wave', 'speed_threshold',
+                  'speed_threshold_step', 'speed_step', 'slowdown_duration', 'boost_duration', 'precise_collision',
+                  'spawn_pattern')
+
+    def to_dict(self):
+        '''JSON-friendly constructor arguments that rebuild these rules'''
+        params = {name: getattr(self, name) for name in Rules.PARAMETERS}
+        params['item_weights'] = {item_type.name: weight for item_type, weight in self.item_weights.items()}
+        return params
+
+    @staticmethod
+    def from_dict(params):
+        params = dict(params)
+        params['item_weights'] = {ItemType[name]: weight for name, weight in params['item_weights'].items()}
+        return Rules(**params)
+
+    def pattern(self):
+        '''The spawn pattern with every key filled in'''
+        pattern = self.spawn_pattern
+        if isinstance(pattern, str):
+            if pattern not in SPAWN_PATTERNS:
+                raise ValueError(f'unknown spawn pattern {pattern!r}, expected one of {sorted(SPAWN_PATTERNS)}')
+            pattern = SPAWN_PATTERNS[pattern]
+        return dict(PATTERN_DEFAULTS, **pattern)
+
+    def spawn_table(self):
+        '''Item types repeated by weight, so one choice() picks with the right odds'''
+        return [item_type for item_type, weight in self.item_weights.items() for _ in range(weight)]
+
+class SimItem:
+    __slots__ = ('type', 'variant', 'x', 'y', 'size', 'speed')
+
+    def __init__(self, type, variant, x, y, size, speed):
+        self.type = type
+        self.variant = variant
+        self.x = x
+        self.y = y
+        self.size = size
+        self.speed = speed
+
+class SimPlayer:
+    __slots__ = ('x', 'y', 'size', 'speed')
+
+    def __init__(self, x, y, size, speed):
+        self.x = x
+        self.y = y
+        self.size = size
+        self.speed = speed
+
+def overlaps(x1, y1, w1, h1, x2, y2, w2, h2):
+    '''Same test as pygame.Rect.colliderect for rects with positive size'''
+    return x1 < x2 + w2 and x2 < x1 + w1 and y1 < y2 + h2 and y2 < y1 + h1
+
+def percentile(sorted_values, fraction):
+    '''Nearest-rank value at fraction (0.5 for the median) of an already sorted list, 0.0 when it is empty'''
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+# Phases of a tick in which scheduled events run
+BEFORE_ITEMS = 0 # Spawns, so new items move and can be caught in the tick they appear
+AFTER_ITEMS = 1 # Effect expiry and the countdown, once the clock has moved on
+
+class Scheduler:
+    '''Timed events of a round in a heap ordered by (tick, phase, insertion order).
+       Round.tick runs whatever is due in each phase instead of checking every timer every tick.'''
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def at(self, tick, phase, action, *args):
+        '''Runs action(*args) in the given phase of tick; returns a handle for cancel()'''
+        entry = [tick, phase, self.count, action, args]
+        self.count += 1
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[3] = None # Skipped when it comes due
+
+    def run_due(self, tick, phase):
+        '''Runs, in order, every event due up to this phase of tick, including ones scheduled meanwhile'''
+        heap = self.heap
+        while heap and (heap[0][0] < tick or heap[0][0] == tick and heap[0][1] <= phase):
+            entry = heapq.heappop(heap)
+            if entry[3] is not None:
+                entry[3](*entry[4])
+
+# Outcomes of a finished round
+WIN = 'win'
+LOSE = 'lose'
+TIMEOUT = 'timeout'
+
+# Kinds of event returned by Round.tick
+SPAWNED = 'spawned'
+CAUGHT = 'caught'
+LANDED = 'landed'
+
+class Round:
+    '''One round of the game as plain data. All randomness comes from the round's own RNG.'''
+    # Optional profiler hook: section(name) returns a context manager timing one phase of a tick
+    section = None
+    # Optional narrow phase: collide(player, item) confirms a rect overlap, e.g. with pixel masks.
+    # Only rounds whose rules have precise_collision set should be given one.
+    collide = None
+
+    def __init__(self, rules=None, seed=None):
+        self.rules = rules or Rules()
+        # Always know the seed, so any round can be recorded and replayed
+        self.seed = random.randrange(2**63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.recorder = None # Optional replay.ReplayWriter logging every input and tick
+        self.spawn_table = self.rules.spawn_table()
+        self.score = 0
+        self.stars = self.rules.starting_stars
+        self.item_speed = self.rules.item_speed
+        self.player = SimPlayer(int(self.rules.player_x), int(self.rules.player_y),
+                                self.rules.player_size, self.rules.player_speed)
+        self.items = []
+        self.ticks = 0
+        self.elapsed_time = 0
+        self.remaining_time = self.rules.round_time
+        self.countdown_value = None
+        self.num_items_to_spawn = self.rules.items_per_wave
+        self.spawn_threshold = self.rules.spawn_threshold
+        self.speed_threshold = self.rules.speed_threshold
+        self.slowdown_active = False
+        self.boost_active = False
+        self.slowdown_timer = 0
+        self.boost_timer = 0
+        self.outcome = None # WIN, LOSE or TIMEOUT once the round is over
+
+        # Ticks are numbered from 1; events scheduled for tick n run while the n-th tick() is running
+        self.events = [] # Events of the tick in progress, for scheduled spawns to report into
+        self.pattern = self.rules.pattern()
+        self.next_lane = 0
+        self.expiry = {'slowdown': None, 'boost': None} # Scheduled end of each active effect
+        self.scheduler = Scheduler()
+        rules = self.rules
+        for seconds, attribute, step in self.pattern['ramps']:
+            self.scheduler.at(int(seconds * rules.tick_rate + 0.5), BEFORE_ITEMS, self.ramp, attribute, step)
+        self.scheduler.at(rules.spawn_interval, BEFORE_ITEMS, self.wave)
+        self.scheduler.at(max(1, int((rules.round_time - rules.countdown_time) * rules.tick_rate)),
+                          AFTER_ITEMS, self.countdown)
+
+    def move_player(self, direction):
+        '''Moves the player one step left (-1) or right (1), keeping it on the field'''
+        if self.recorder is not None:
+            self.recorder.move(direction)
+        player = self.player
+        if direction < 0 and player.x > 0:
+            player.x -= player.speed
+        if direction > 0 and player.x + player.size < self.rules.width:
+            player.x += player.speed
+        if player.x < 0:
+            player.x = 0
+        if player.x + player.size > self.rules.width:
+            player.x = self.rules.width - player.size
+
+    def spawn_item(self, x=None):
+        '''Spawn a new item with random type and variant, at x or a random position'''
+        rng = self.rng
+        item_type = rng.choice(self.spawn_table)
+        count = ITEM_VARIANTS[item_type]
+        variant = rng.randint(1, count) if count > 1 else 1
+        size = self.rules.item_size
+        speed = self.item_speed
+        if item_type == ItemType.BAD:
+            speed -= self.rules.bad_item_slowdown
+        if x is None:
+            x = rng.randint(0, self.rules.width - size)
+        return SimItem(item_type, variant, x, 0, size, speed)
+
+    def catch(self, item_type):
+        '''Apply the effects of catching an item of the given type'''
+        player = self.player
+        if item_type == ItemType.SLOWDOWN and player.speed > self.rules.slowdown_penalty:
+            player.speed -= self.rules.slowdown_penalty
+            self.slowdown_active = True
+            self.slowdown_timer = self.elapsed_time
+            self.expire_later('slowdown', self.rules.slowdown_duration)
+        if item_type == ItemType.SPEEDUP:
+            player.speed += self.rules.boost_bonus
+            self.boost_active = True
+            self.boost_timer = self.elapsed_time
+            self.expire_later('boost', self.rules.boost_duration)
+
+        if item_type == ItemType.GOOD:
+            self.score += 1
+        elif item_type == ItemType.BONUS:
+            self.score += 3
+        elif item_type == ItemType.BAD:
+            self.stars -= 0.5
+        elif item_type == ItemType.SLOWDOWN:
+            self.stars -= 1
+
+    def tick(self, move=0):
+        '''Advances the round by one tick. move is -1, 0 or 1 for the player.
+           Returns a list of (SPAWNED | CAUGHT | LANDED, item) events.'''
+        if self.outcome is not None:
+            return []
+        events = self.events = []
+        if move:
+            self.move_player(move)
+        if self.recorder is not None:
+            self.recorder.tick()
+        section = self.section
+        if section is None:
+            self.spawn_wave(events)
+            self.update_items(events)
+            self.update_timers()
+        else:
+            with section('sim.spawn'):
+                self.spawn_wave(events)
+            with section('sim.items'): # Movement, ground culling and collision share one pass
+                self.update_items(events)
+            with section('sim.timers'):
+                self.update_timers()
+        return events
+
+    def spawn_wave(self, events):
+        '''Score-driven wave growth, checked every tick, then whatever spawns are due'''
+        rules = self.rules
+        if self.score >= self.spawn_threshold and self.num_items_to_spawn < rules.max_items_per_wave:
+            self.num_items_to_spawn += 1
+            self.spawn_threshold += rules.spawn_threshold_step
+        self.scheduler.run_due(self.ticks + 1, BEFORE_ITEMS)
+
+    def wave(self):
+        '''Scheduled every spawn_interval ticks: starts a wave, staggered by the spawn pattern'''
+        tick = self.ticks + 1
+        stagger = self.pattern['stagger']
+        for i in range(self.num_items_to_spawn):
+            if stagger and i:
+                self.scheduler.at(tick + i * stagger, BEFORE_ITEMS, self.drop)
+            else:
+                self.drop()
+        self.scheduler.at(tick + self.rules.spawn_interval, BEFORE_ITEMS, self.wave)
+
+    def drop(self):
+        '''Spawns one item, in a lane if the spawn pattern has them'''
+        lanes = self.pattern['lanes']
+        x = None
+        if lanes:
+            if self.pattern['sweep']:
+                lane = self.next_lane
+                self.next_lane = (self.next_lane + 1) % lanes
+            else:
+                lane = self.rng.randrange(lanes)
+            x = lane * (self.rules.width - self.rules.item_size) // max(1, lanes - 1)
+        self.add_item(self.spawn_item(x), self.events)
+
+    def ramp(self, attribute, step):
+        '''Scheduled difficulty step from the spawn pattern'''
+        if attribute == 'items_per_wave':
+            self.num_items_to_spawn = min(self.num_items_to_spawn + step, self.rules.max_items_per_wave)
+        elif attribute == 'item_speed':
+            self.item_speed += step
+        else:
+            raise ValueError(f'unknown ramp {attribute!r}')
+
+    def add_item(self, item, events):
+        self.items.append(item)
+        events.append((SPAWNED, item))
+
+    def update_items(self, events):
+        '''Moves every item one tick, then removes the ones that landed or were caught'''
+        player = self.player
+        ground_y = self.rules.ground_y
+        collide = self.collide
+        remaining = []
+        for item in self.items:
+            item.y += int(item.speed)
+            if item.y >= ground_y:
+                events.append((LANDED, item))
+            elif overlaps(player.x, player.y, player.size, player.size, item.x, item.y, item.size, item.size) \
+                    and (collide is None or collide(player, item)):
+                self.catch(item.type)
+                events.append((CAUGHT, item))
+            else:
+                remaining.append(item)
+        self.items = remaining
+
+    def update_timers(self):
+        '''Clock, scheduled timers (effect expiry, countdown), difficulty and the end of the round'''
+        rules = self.rules
+        self.ticks += 1
+        self.elapsed_time = self.ticks / rules.tick_rate
+        self.remaining_time = rules.round_time - self.elapsed_time
+        self.scheduler.run_due(self.ticks, AFTER_ITEMS)
+
+        # Speed up items as the score grows
+        if self.score >= self.speed_threshold:
+            self.item_speed += rules.speed_step
+            self.speed_threshold += rules.speed_threshold_step
+
+        if self.score >= rules.winning_score and self.stars > rules.winning_stars:
+            self.outcome = WIN
+        elif self.stars <= 0:
+            self.outcome = LOSE
+        elif self.remaining_time <= 0:
+            self.outcome = TIMEOUT
+
+    def expire_later(self, effect, duration):
+        '''Schedules the end of a slowdown or boost, replacing the end of an earlier one'''
+        if self.expiry[effect] is not None:
+            Scheduler.cancel(self.expiry[effect])
+        due = self.ticks + int(duration * self.rules.tick_rate + 0.5)
+        self.expiry[effect] = self.scheduler.at(due, AFTER_ITEMS, self.expire, effect, duration)
+
+    def expire(self, effect, duration):
+        '''Scheduled end of an effect: the player is back to normal speed'''
+        started = self.slowdown_timer if effect == 'slowdown' else self.boost_timer
+        if self.elapsed_time - started < duration:
+            # Durations that are not a whole number of ticks end on the first tick past them
+            self.expiry[effect] = self.scheduler.at(self.ticks + 1, AFTER_ITEMS, self.expire, effect, duration)
+            return
+        self.expiry[effect] = None
+        self.player.speed = self.rules.player_speed
+        if effect == 'slowdown':
+            self.slowdown_active = False
+        else:
+            self.boost_active = False
+
+    def countdown(self):
+        '''Scheduled from the start of the countdown: updates the number shown and schedules its next change'''
+        rules = self.rules
+        if not self.in_countdown():
+            self.scheduler.at(self.ticks + 1, AFTER_ITEMS, self.countdown)
+            return
+        self.countdown_value = math.ceil(self.remaining_time) # Whole seconds left, rounded up, so it goes from 10 to 0
+        # The number drops once remaining_time is below countdown_value - 1; start looking a tick early
+        due = int((rules.round_time - (self.countdown_value - 1)) * rules.tick_rate)
+        self.scheduler.at(max(due, self.ticks + 1), AFTER_ITEMS, self.countdown)
+
+    def in_countdown(self):
+        return self.remaining_time <= self.rules.countdown_time
+
+# Scripted policies, used by headless runs in place of a keyboard
+def idle_policy(round):
+    return 0
+
+def catcher_policy(round):
+    '''Steps toward the lowest good or bonus item, never into the column of a bad item about to land'''
+    player = round.player
+    danger_y = player.y - player.size # Bad items below this line are too close to walk under
+    target = None
+    for item in round.items:
+        if item.type in (ItemType.GOOD, ItemType.BONUS) and item.y < player.y + player.size:
+            if target is None or item.y > target.y:
+                target = item
+
+    best_move, best_cost = 0, None
+    for move in (0, -1, 1):
+        x = min(max(player.x + move * player.speed, 0), round.rules.width - player.size)
+        cost = 0
+        for item in round.items:
+            if item.type in (ItemType.BAD, ItemType.SLOWDOWN) and item.y >= danger_y and \
+                    overlaps(x, 0, player.size, 1, item.x, 0, item.size, 1):
+                cost += round.rules.width
+        if target is not None:
+            cost += abs(target.x + target.size / 2 - (x + player.size / 2))
+        if best_cost is None or cost < best_cost:
+            best_move, best_cost = move, cost
+    return best_move
+
+POLICIES = {
+    'idle': idle_policy,
+    'catcher': catcher_policy,
+}
+
+def play_round(rules=None, seed=None, policy=catcher_policy, max_ticks=None):
+    '''Plays one round to the end and returns it'''
+    round = Round(rules, seed)
+    while round.outcome is None:
+        round.tick(policy(round))
+        if max_ticks is not None and round.ticks >= max_ticks:
+            break
+    return round
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Play headless rounds and print a summary')
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first round; round i uses seed + i')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='catcher')
+    parser.add_argument('--pattern', choices=sorted(SPAWN_PATTERNS), default='burst', help='how waves are spawned')
+    args = parser.parse_args()
+    rules = Rules(spawn_pattern=args.pattern)
+
+    start = time.perf_counter()
+    outcomes = {WIN: 0, LOSE: 0, TIMEOUT: 0}
+    scores = []
+    ticks = 0
+    for i in range(args.rounds):
+        round = play_round(rules, seed=args.seed + i, policy=POLICIES[args.policy])
+        outcomes[round.outcome] += 1
+        scores.append(round.score)
+        ticks += round.ticks
+    elapsed = time.perf_counter() - start
+
+    print(f'{args.rounds} rounds, policy {args.policy}, pattern {args.pattern}')
+    print(f'  wins {outcomes[WIN]}, losses {outcomes[LOSE]}, timeouts {outcomes[TIMEOUT]}')
+    print(f'  score mean {sum(scores) / len(scores):.1f}, min {min(scores)}, max {max(scores)}')
+    print(f'  {ticks / elapsed:,.0f} ticks/s')
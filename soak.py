@@ -0,0 +1,155 @@
+# soak.py
+# Soak test for kiosks that run rounds back to back for days. The autoplay bot (Game.autoplay) plays
+# round after round through the real game states: GamePlayState, GameOverState and its restart, with
+# sprites, pools, caches and sounds, headless and one simulation tick per frame. After every round it
+# records traced Python memory (tracemalloc), live Surface and Sprite counts, the falling item
+# sprites and the item pool, and frame-time percentiles. After a warm-up it fits a trend through each
+# series and fails if memory, live objects or frame times trend upward over the rounds. Everything the
+# game prefetches at launch is loaded first, so caches filling on first use do not read as growth.
+# Usage: python soak.py --rounds 50 [--policy catcher] [--warmup 5] [--json soak.json]
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from simulation import percentile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+COLUMNS = ['round', 'outcome', 'score', 'ticks', 'p50_ms', 'p95_ms', 'p99_ms', 'falling_max',
+           'pool_size', 'traced_kb', 'surfaces', 'sprites']
+
+def live_objects(pygame):
+    '''(Surfaces, Sprites) reachable from the garbage collector after a full collection.
+       Surfaces are not tracked by the collector, so they are found among what tracked objects refer to.'''
+    gc.collect()
+    tracked = gc.get_objects()
+    sprites = sum(1 for obj in tracked if isinstance(obj, pygame.sprite.Sprite))
+    surfaces = {id(obj) for obj in gc.get_referents(*tracked) if isinstance(obj, pygame.Surface)}
+    return len(surfaces), sprites
+
+def play_round(game, main):
+    '''Frames until the round is over and the bot has restarted; returns frame times and falling item counts'''
+    frame_ms, falling = [], []
+    state = game.state
+    while True:
+        start = time.perf_counter()
+        events = main.Input.poll()
+        game.dirty_rects = None
+        game.state.handle_events(events)
+        game.step(events, main.SIM_STEP)
+        game.state.render(game.screen)
+        game.present()
+        frame_ms.append((time.perf_counter() - start) * 1000)
+        if game.state is state:
+            # The sprite list has to mirror the simulated items exactly, every tick
+            if len(state.falling_items) != len(state.round.items):
+                raise SystemExit(f'falling_items has {len(state.falling_items)} sprites for '
+                                 f'{len(state.round.items)} items after {state.round.ticks} ticks')
+            falling.append(len(state.falling_items))
+        elif isinstance(game.state, main.GamePlayState):
+            return state.round, frame_ms, falling
+
+def slope(values):
+    '''Change per round: the median slope between every pair of rounds (Theil-Sen), so one heavy
+       round, such as a timeout with the screen full of items, does not read as a trend'''
+    slopes = sorted((values[j] - values[i]) / (j - i) for i in range(len(values)) for j in range(i + 1, len(values)))
+    return slopes[len(slopes) // 2] if slopes else 0.0
+
+def trends(rows, args):
+    '''Failure messages for every series whose fitted growth over the measured rounds is past its tolerance'''
+    failures = []
+    measured = rows[args.warmup:]
+    if len(measured) < 3:
+        return [f'need at least 3 rounds after the {args.warmup} warm-up rounds to fit a trend']
+    span = len(measured) - 1
+    growth = slope([row['traced_kb'] for row in measured]) * span
+    if growth > args.memory_tolerance:
+        failures.append(f'traced memory grows {growth:.0f} KB over {len(measured)} rounds '
+                        f'(tolerance {args.memory_tolerance:.0f} KB)')
+    for column in ('surfaces', 'sprites'):
+        growth = slope([row[column] for row in measured]) * span
+        if growth > args.object_tolerance:
+            failures.append(f'live {column} grow by {growth:.0f} over {len(measured)} rounds '
+                            f'(tolerance {args.object_tolerance})')
+    for column in ('p50_ms', 'p95_ms'):
+        values = [row[column] for row in measured]
+        typical = sorted(values)[len(values) // 2]
+        growth = slope(values) * span / typical if typical else 0.0
+        if growth > args.latency_tolerance:
+            failures.append(f'{column} grows {growth:.0%} over {len(measured)} rounds '
+                            f'(tolerance {args.latency_tolerance:.0%})')
+    return failures
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Autoplay soak test: fails on memory, object or frame-time growth')
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--policy', default='catcher', help='autoplay policy from simulation.POLICIES')
+    parser.add_argument('--warmup', type=int, default=3, help='rounds left out of the trends while caches fill')
+    parser.add_argument('--memory-tolerance', type=float, default=256, help='KB of traced memory growth allowed')
+    parser.add_argument('--object-tolerance', type=int, default=8, help='live Surfaces or Sprites gained allowed')
+    parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                        help='frame-time percentile growth allowed, 0.25 = 25%%')
+    parser.add_argument('--json', metavar='FILE', help='write every round row and the verdict as JSON')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    root = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, root)
+    os.chdir(root)
+    import pygame
+    import main
+    from simulation import POLICIES
+
+    pygame.display.set_mode(main.WINDOW_SIZE)
+    main.AssetBundle.load_all()
+    keys = main.GamePlayState.prefetch_assets() + main.GameOverState.prefetch_assets()
+    while main.AssetLoader.progress(keys) < 1:
+        time.sleep(0.01)
+    game = main.Game()
+    game.autoplay = POLICIES[args.policy]
+    game.screen = game.framebuffer()
+    game.state = main.GamePlayState(game)
+
+    rows = []
+    baseline = None
+    print(' '.join(f'{column:>11}' for column in COLUMNS))
+    for number in range(1, args.rounds + 1):
+        round, frame_ms, falling = play_round(game, main)
+        frame_ms.sort()
+        surfaces, sprites = live_objects(pygame)
+        row = {
+            'round': number, 'outcome': round.outcome, 'score': round.score, 'ticks': round.ticks,
+            'p50_ms': percentile(frame_ms, 0.5), 'p95_ms': percentile(frame_ms, 0.95),
+            'p99_ms': percentile(frame_ms, 0.99), 'falling_max': max(falling, default=0),
+            'pool_size': main.item_pool.stats()['size'],
+            'traced_kb': tracemalloc.get_traced_memory()[0] / 1024, 'surfaces': surfaces, 'sprites': sprites,
+        }
+        rows.append(row)
+        print(' '.join(f'{row[column]:>11.2f}' if isinstance(row[column], float) else f'{row[column]:>11}'
+                       for column in COLUMNS), flush=True)
+        if number == args.warmup:
+            baseline = tracemalloc.take_snapshot()
+
+    failures = trends(rows, args)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures and baseline is not None:
+        print('Largest allocation growth since the warm-up:')
+        for stat in tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:10]:
+            print(f'  {stat}')
+    if not failures:
+        print(f'ok: no upward trend over {len(rows) - args.warmup} rounds after {args.warmup} warm-up rounds')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rounds': rows, 'failures': failures}, f, indent=2)
+    raise SystemExit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,91 @@
+# stress.py
+# Stress engine: the rules of simulation.Round with falling items kept in NumPy arrays
+# (structure of arrays), so movement, ground culling and catching are one batched operation
+# per tick. Meant for headless runs with thousands of simultaneous items. Requires numpy.
+
+import numpy as np
+from simulation import ItemType, Round, SimItem
+
+TYPES = list(ItemType) # Type code stored in ItemBuffers.type -> ItemType
+TYPE_CODES = {item_type: code for code, item_type in enumerate(TYPES)}
+
+class ItemBuffers:
+    '''Falling items as parallel arrays; live items occupy indexes [0, count) in spawn order'''
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.x = np.zeros(capacity, np.int64)
+        self.y = np.zeros(capacity, np.int64)
+        self.speed = np.zeros(capacity, np.float64)
+        self.type = np.zeros(capacity, np.int8)
+        self.variant = np.zeros(capacity, np.int8)
+
+    def columns(self):
+        return ('x', 'y', 'speed', 'type', 'variant')
+
+    def grow(self):
+        for name in self.columns():
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def append(self, item):
+        if self.count == len(self.x):
+            self.grow()
+        i = self.count
+        self.x[i] = item.x
+        self.y[i] = item.y
+        self.speed[i] = item.speed
+        self.type[i] = TYPE_CODES[item.type]
+        self.variant[i] = item.variant
+        self.count += 1
+
+    def keep(self, mask):
+        '''Drops every live item whose mask entry is False, preserving order'''
+        n = self.count
+        kept = int(np.count_nonzero(mask))
+        for name in self.columns():
+            column = getattr(self, name)
+            column[:kept] = column[:n][mask]
+        self.count = kept
+
+class VectorRound(Round):
+    '''Round whose items live in ItemBuffers. Plays exactly like Round for the same rules and seed,
+       but tick() reports no per-item events; caught and landed keep running totals instead.'''
+    def __init__(self, rules=None, seed=None, capacity=1024):
+        super().__init__(rules, seed)
+        self.buffers = ItemBuffers(capacity)
+        self.caught = 0
+        self.landed = 0
+
+    def item_count(self):
+        return self.buffers.count
+
+    def add_item(self, item, events):
+        self.buffers.append(item)
+
+    def update_items(self, events):
+        buffers = self.buffers
+        n = buffers.count
+        if n == 0:
+            return
+        player = self.player
+        size = self.rules.item_size
+        x = buffers.x[:n]
+        y = buffers.y[:n]
+        y += buffers.speed[:n].astype(np.int64) # int() truncation, as in Round
+
+        landed = y >= self.rules.ground_y
+        caught = ~landed & (x < player.x + player.size) & (player.x < x + size) \
+                         & (y < player.y + player.size) & (player.y < y + size)
+        if self.collide is not None:
+            # Only the few rect hits go through the narrow phase
+            for i in np.flatnonzero(caught):
+                item = SimItem(TYPES[buffers.type[i]], int(buffers.variant[i]), int(x[i]), int(y[i]), size, buffers.speed[i])
+                caught[i] = self.collide(player, item)
+        # Catch effects depend on order (slowdown checks the current speed), so apply them in spawn order
+        for code in buffers.type[:n][caught]:
+            self.catch(TYPES[code])
+        self.caught += int(np.count_nonzero(caught))
+        self.landed += int(np.count_nonzero(landed))
+        buffers.keep(~(landed | caught))